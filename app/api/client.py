@@ -0,0 +1,88 @@
+import os
+
+import httpx
+
+
+class DocsQueryClient:
+    """
+    Thin synchronous client for the HTTP API in app.api.server,
+    used by the Streamlit UI when DOCSQUERY_API_URL is set.
+    """
+
+    def __init__(self, base_url=None, timeout=None):
+        self.base_url = (base_url or os.getenv("DOCSQUERY_API_URL", "http://localhost:8000")).rstrip("/")
+        self._client = httpx.Client(base_url=self.base_url, timeout=timeout or float(os.getenv("DOCSQUERY_API_TIMEOUT", 300)))
+
+    @staticmethod
+    def _files(uploaded_docs):
+        return [
+            ("files", (file.name, file.getvalue() if hasattr(file, "getvalue") else file.read()))
+            for file in uploaded_docs
+        ]
+
+    # ---------------- Collections ----------------
+    def list_collections(self):
+        response = self._client.get("/collections")
+        response.raise_for_status()
+        return response.json()
+
+    def ingest(self, uploaded_docs, collection_name=None):
+        params = {"collection": collection_name} if collection_name else None
+        response = self._client.post("/collections", files=self._files(uploaded_docs), params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def add_documents(self, collection_name, uploaded_docs):
+        response = self._client.post(f"/collections/{collection_name}/documents", files=self._files(uploaded_docs))
+        response.raise_for_status()
+        return response.json()
+
+    def remove_documents(self, collection_name, sources):
+        response = self._client.delete(f"/collections/{collection_name}/documents", params={"source": sources})
+        response.raise_for_status()
+        return response.json()
+
+    def delete_collection(self, collection_name):
+        response = self._client.delete(f"/collections/{collection_name}")
+        response.raise_for_status()
+        return response.json()
+
+    # ---------------- Query ----------------
+    def query(self, collection_name, user_query, history=None):
+        payload = {"collection": collection_name, "query": user_query, "history": history or []}
+        response = self._client.post("/query", json=payload)
+        response.raise_for_status()
+        return response.json()["answer"]
+
+    def stream_query(self, collection_name, user_query, history=None):
+        """
+        Yields answer text as the server streams it.
+        history: earlier {"role", "content"} messages of the chat, for follow-up questions
+        """
+        payload = {"collection": collection_name, "query": user_query, "history": history or []}
+        with self._client.stream("POST", "/query/stream", json=payload) as response:
+            response.raise_for_status()
+            yield from response.iter_text()
+
+    # ---------------- Federated Query ----------------
+    def federated_query(self, user_query, collection_names, filters=None, history=None):
+        """
+        Answer from several collections at once; the server caps how many can be named.
+        filters: chunk metadata to match, e.g. {"source": ["leave.pdf", "travel.pdf"]}
+        """
+        payload = {
+            "query": user_query, "collections": list(collection_names),
+            "filters": filters or {}, "history": history or [],
+        }
+        response = self._client.post("/federated/query", json=payload)
+        response.raise_for_status()
+        return response.json()["answer"]
+
+    def stream_federated_query(self, user_query, collection_names, filters=None, history=None):
+        payload = {
+            "query": user_query, "collections": list(collection_names),
+            "filters": filters or {}, "history": history or [],
+        }
+        with self._client.stream("POST", "/federated/query/stream", json=payload) as response:
+            response.raise_for_status()
+            yield from response.iter_text()
@@ -0,0 +1,255 @@
+"""
+Async HTTP API over AIHelper.
+
+Run with several workers behind a load balancer, all sharing INDEX_STORE_DIR:
+    uvicorn app.api.server:app --host 0.0.0.0 --port 8000 --workers 4
+
+Parsing, embedding, FAISS search and LLM calls are blocking, so every handler
+hands them to the threadpool and the event loop only does I/O.
+"""
+import uuid
+from typing import Dict, List, Literal, Optional, Union
+
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+
+from app.exceptions.index import CollectionInUseError, EmbeddingMismatchError
+from app.helper.ai_helper import AIHelper
+from app.helper.index_store import IndexStore
+from app.helper.document_helper import DocumentHelper, UploadedBytes
+from app.helper.federated_retriever import FederatedRetriever
+from app.helper.llm_helper import EmbeddingGenerator
+from app.helper.metrics_helper import Metrics
+
+app = FastAPI(title="DocsQuery AI")
+
+
+class ChatMessage(BaseModel):
+    role: Literal["user", "assistant"]
+    content: str
+
+
+class QueryRequest(BaseModel):
+    collection: str
+    query: str
+    # Earlier turns of the chat, oldest first; follow-up questions are rewritten against them
+    history: List[ChatMessage] = []
+
+
+class FederatedQueryRequest(BaseModel):
+    query: str
+    # Collections to search together, at least one and at most FEDERATED_MAX_COLLECTIONS
+    collections: List[str] = Field(min_length=1, max_length=FederatedRetriever.max_collections)
+    # Chunk metadata to match, a value or a list of accepted values per key, e.g. {"source": ["a.pdf"]}
+    filters: Dict[str, Union[str, int, List[Union[str, int]]]] = {}
+    history: List[ChatMessage] = []
+
+
+# ---------------- Helpers ----------------
+async def _read_uploads(files):
+    uploads = []
+    for file in files:
+        ext = file.filename.lower().split(".")[-1]
+        if ext not in DocumentHelper.supported_formats:
+            raise HTTPException(status_code=415, detail=f"Unsupported file format: {file.filename}")
+        uploads.append(UploadedBytes(file.filename, await file.read()))
+    return uploads
+
+
+def _require_collection(*collection_names):
+    """
+    Reads meta.json and may initialise the embedding model, so it runs on the threadpool
+    """
+    embeddings = EmbeddingGenerator.get_cached_embedding_model()
+    for collection_name in collection_names:
+        try:
+            exists = AIHelper.index_store.exists(collection_name)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not exists:
+            raise HTTPException(status_code=404, detail=f"Unknown collection: {collection_name}")
+        try:
+            AIHelper.index_store._check_embeddings(collection_name, embeddings)
+        except EmbeddingMismatchError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+
+def _collection_response(collection_name):
+    meta = AIHelper.index_store.get_meta(collection_name) or {}
+    return {
+        "collection": collection_name,
+        "count": meta.get("count", 0),
+        "sources": meta.get("sources", []),
+        "generation": meta.get("generation", 0),
+    }
+
+
+def _update_collection(collection_name, update):
+    """
+    Run an AIHelper session-based update on behalf of a request.
+    A collection shared with live sessions is forked, so the response
+    may name a new collection.
+    """
+    session_id = f"api-{uuid.uuid4().hex}"
+    AIHelper.session_registry.attach(session_id, collection_name)
+    try:
+        return update(session_id)
+    finally:
+        AIHelper.session_registry.release(session_id)
+
+
+# ---------------- Collections ----------------
+@app.get("/collections")
+async def list_collections():
+    collections = await run_in_threadpool(AIHelper.index_store.list_collections)
+    return [
+        {"collection": name, "count": meta.get("count", 0), "sources": meta.get("sources", [])}
+        for name, meta in collections
+    ]
+
+
+def _create_collection(uploads, collection_name):
+    """
+    Without a name the files map to a collection named after their content, which is
+    reused when the same files were indexed before. An explicit name must be new,
+    files are added to an existing collection through its documents endpoint.
+    The existence check and the build run under the collection's file lock, so of two
+    workers creating the same name only one builds it.
+    """
+    explicit = collection_name is not None
+    collection_name = collection_name or IndexStore.collection_name_for(uploads)
+    try:
+        AIHelper.index_store._path(collection_name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    with AIHelper.index_store._file_lock(collection_name):
+        if explicit and AIHelper.index_store.exists(collection_name):
+            raise HTTPException(
+                status_code=409,
+                detail=f"Collection already exists: {collection_name}. "
+                       f"Add files with POST /collections/{collection_name}/documents."
+            )
+        result = AIHelper.build_vectorstore_from_docs(uploads, collection_name)
+    if isinstance(result, str):
+        raise HTTPException(status_code=422, detail=result)
+    return _collection_response(collection_name)
+
+
+@app.post("/collections", status_code=201)
+async def ingest(files: List[UploadFile] = File(...), collection: Optional[str] = Query(None)):
+    """
+    Index the uploaded files as a new collection; the same files map to the same collection
+    """
+    uploads = await _read_uploads(files)
+    return await run_in_threadpool(_create_collection, uploads, collection)
+
+
+@app.post("/collections/{collection_name}/documents")
+async def add_documents(collection_name: str, files: List[UploadFile] = File(...)):
+    await run_in_threadpool(_require_collection, collection_name)
+    uploads = await _read_uploads(files)
+    result = await run_in_threadpool(
+        _update_collection, collection_name,
+        lambda session_id: AIHelper.add_documents(session_id, uploads)
+    )
+    if isinstance(result, str):
+        raise HTTPException(status_code=422, detail=result)
+    return await run_in_threadpool(_collection_response, result[0])
+
+
+@app.delete("/collections/{collection_name}/documents")
+async def remove_documents(collection_name: str, source: List[str] = Query(...)):
+    await run_in_threadpool(_require_collection, collection_name)
+    result = await run_in_threadpool(
+        _update_collection, collection_name,
+        lambda session_id: AIHelper.remove_documents(session_id, source)
+    )
+    if isinstance(result, str):
+        raise HTTPException(status_code=422, detail=result)
+    return await run_in_threadpool(_collection_response, result[0])
+
+
+@app.delete("/collections/{collection_name}")
+async def delete_collection(collection_name: str):
+    await run_in_threadpool(_require_collection, collection_name)
+    # Sessions of every worker pin the collections they use, the store refuses to delete those
+    try:
+        await run_in_threadpool(AIHelper.index_store.delete, collection_name)
+    except CollectionInUseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    AIHelper.answer_cache.invalidate(collection_name)
+    return {"collection": collection_name, "deleted": True}
+
+
+# ---------------- Query ----------------
+@app.post("/query")
+async def query(request: QueryRequest):
+    await run_in_threadpool(_require_collection, request.collection)
+    history = [message.model_dump() for message in request.history]
+    answer = await run_in_threadpool(AIHelper.answer_query, request.query, request.collection, history)
+    return {"collection": request.collection, "answer": answer}
+
+
+@app.post("/query/stream")
+async def stream_query(request: QueryRequest):
+    """
+    Stream the answer as plain text chunks while the LLM generates it.
+    The synchronous generator is iterated on the threadpool by StreamingResponse.
+    """
+    await run_in_threadpool(_require_collection, request.collection)
+    history = [message.model_dump() for message in request.history]
+    return StreamingResponse(
+        AIHelper.stream_query(request.query, request.collection, history),
+        media_type="text/plain; charset=utf-8"
+    )
+
+
+# ---------------- Federated Query ----------------
+@app.post("/federated/query")
+async def federated_query(request: FederatedQueryRequest):
+    await run_in_threadpool(_require_collection, *request.collections)
+    history = [message.model_dump() for message in request.history]
+    answer = await run_in_threadpool(
+        AIHelper.answer_federated, request.query, request.collections, request.filters, history
+    )
+    return {"collections": request.collections, "answer": answer}
+
+
+@app.post("/federated/query/stream")
+async def federated_stream_query(request: FederatedQueryRequest):
+    await run_in_threadpool(_require_collection, *request.collections)
+    history = [message.model_dump() for message in request.history]
+    return StreamingResponse(
+        AIHelper.stream_federated(request.query, request.collections, request.filters, history),
+        media_type="text/plain; charset=utf-8"
+    )
+
+
+# ---------------- Health / Metrics ----------------
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Stage latencies, throughput counters and cache hit rates in the Prometheus text format
+    """
+    body = await run_in_threadpool(Metrics.render_prometheus)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/stats")
+async def stats():
+    embedding_cache = await run_in_threadpool(EmbeddingGenerator.get_embedding_cache)
+    return {
+        "loaded_collections": len(AIHelper.index_store._loaded),
+        "sessions": len(AIHelper.session_registry._sessions),
+        "embedding_cache": await run_in_threadpool(embedding_cache.stats) if embedding_cache else None,
+        "answer_cache": AIHelper.answer_cache.stats(),
+        "context_packing": AIHelper.context_packer.stats(),
+        "query_rewrite": AIHelper.query_rewriter.stats(),
+    }
@@ -21,7 +21,24 @@ class GeminiException(Exception):
             model_name = model_match.group(1)
             message = f"Quota exceeded for: model: {model_name}, daily_request_limit: {quota_value}"
             return message if message else error_str
-    
+        return error_str
+
+    # Find the ResourceExhausted/DeadlineExceeded behind an exception, also when
+    # LangChain re-raised it wrapped in its own error type
+    @staticmethod
+    def retryable_cause(e: Exception):
+        while e is not None:
+            if isinstance(e, (ResourceExhausted, DeadlineExceeded)):
+                return e
+            e = e.__cause__
+        return None
+
+    # Server-suggested wait before retrying a quota error, if any
+    @staticmethod
+    def retry_delay(e: Exception):
+        match = re.search(r'retry_delay\s*\{\s*seconds:\s*(\d+)', str(e))
+        return float(match.group(1)) if match else None
+
     # Handle ChatGoogleGenerativeAIError exceptions
     @staticmethod
     def api_key_error(e: ChatGoogleGenerativeAIError):
@@ -0,0 +1,32 @@
+# Raised when a collection is opened with embeddings other than the ones it was built with,
+# since FAISS would silently return meaningless neighbours (or fail on the dimension)
+class EmbeddingMismatchError(ValueError):
+    def __init__(self, name, built_with, active):
+        self.name = name
+        self.built_with = built_with
+        self.active = active
+        super().__init__(
+            f"Collection {name} was built with embeddings {built_with[0]} (dim {built_with[1]}), "
+            f"but the active embedding backend is {active[0]} (dim {active[1]}). "
+            f"Re-upload the documents to index them with the active backend."
+        )
+
+
+# Raised when a collection is saved over a newer version than the one the change was based on,
+# e.g. another API worker updated it in the meantime
+class CollectionConflictError(RuntimeError):
+    def __init__(self, name, expected_generation, current_generation):
+        self.name = name
+        self.expected_generation = expected_generation
+        self.current_generation = current_generation
+        super().__init__(
+            f"Collection {name} changed while it was being updated "
+            f"(generation {current_generation}, expected {expected_generation})."
+        )
+
+
+# Raised when a collection is deleted while a session of any process sharing the store uses it
+class CollectionInUseError(RuntimeError):
+    def __init__(self, name):
+        self.name = name
+        super().__init__(f"Collection is in use: {name}")
@@ -1,68 +1,113 @@
+import os
+import time
+import uuid
+import threading
 import traceback
+from collections import OrderedDict
 
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_core.documents import Document
 from langchain.prompts import PromptTemplate
-from langchain_community.vectorstores.faiss import FAISS
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains.retrieval import create_retrieval_chain
+from langchain_core.runnables import RunnableLambda
 
-from app.helper.llm_helper import GeminiLLM, EmbeddingGenerator
-from app.helper.document_helper import DocumentHelper
+from app.helper.llm_helper import GeminiLLM, EmbeddingGenerator, LLMMetricsCallback
+from app.helper.ingest_helper import IngestPipeline
+from app.helper.index_store import IndexStore
+from app.helper.index_factory import IndexFactory
+from app.helper.session_helper import SessionRegistry
+from app.helper.answer_cache import SemanticAnswerCache
+from app.helper.keyword_index import KeywordIndex
+from app.helper.hybrid_retriever import HybridRetriever
+from app.helper.federated_retriever import FederatedRetriever
+from app.helper.context_packer import ContextPacker
+from app.helper.metrics_helper import Metrics
+from app.helper.query_rewriter import QueryRewriter
+from app.helper.reranker import Reranker
 
 class AIHelper:
     """
     Core AI helper for:
     1. Building vectorstores from uploaded documents
     2. Creating a conversation chain
-    3. Getting responses from the bot
+    3. Getting responses from the bot, from one collection or several at once
     """
-    temporary_vectorstore = {}
+    index_store = IndexStore()
+    session_registry = SessionRegistry(index_store)
+    answer_cache = SemanticAnswerCache()
+    context_packer = ContextPacker()
+    llm_metrics = LLMMetricsCallback()
+    query_rewriter = QueryRewriter()
+    reranker = Reranker()
+
+    # Conversation chains reused across questions, one per collection
+    _chain_cache = OrderedDict()
+    _chain_cache_size = int(os.getenv("CHAIN_CACHE_SIZE", 32))
+    _chain_lock = threading.Lock()
+
+    # Serializes collection updates within this process
+    _update_lock = threading.Lock()
+
+    prompt = PromptTemplate.from_template("""
+            1. You are a helpful assistant.
+            2. Give a clear and concise answer.
+            3. If you don't know the answer, say that you don't know. Don't make up an answer.
+            4. If the question is not related to the context, politely respond that you are tuned to the context.
+            5. If the question is inappropriate, respond with a neutral answer.
+
+            Context:
+            {context}
+
+            Question: {input}
+
+            Helpful Answer:
+            """)
+
+    # ---------------- Load Vectorstore ----------------
+    @staticmethod
+    def get_vectorstore(collection_name):
+        """
+        collection_name: name of a saved collection
+        Returns FAISS vectorstore or None if the collection does not exist
+        """
+        embeddings = EmbeddingGenerator.get_cached_embedding_model()
+        return AIHelper.index_store.get(collection_name, embeddings)
 
     # ---------------- Build Vectorstore ----------------
     @staticmethod
-    def build_vectorstore_from_docs(uploaded_docs):
+    def build_vectorstore_from_docs(uploaded_docs, collection_name=None):
         """
         uploaded_docs: list of files uploaded by user
+        collection_name: name to save the index under, derived from the uploads if not given
         Returns FAISS vectorstore
         """
         try:
-            documents = []
-
-            for file in uploaded_docs:
-                # Extract text using the new DocumentHelper
-                text = DocumentHelper.extractText(file)
-                if not text:
-                    continue  # skip empty files
-
-                # Split text into chunks
-                text_splitter = CharacterTextSplitter(
-                    separator="\n",
-                    chunk_size=1000,
-                    chunk_overlap=200,
-                    length_function=len
-                )
-                chunks = text_splitter.split_text(text)
-                file_name = file.name
-
-                for chunk in chunks:
-                    doc = Document(
-                        page_content=chunk,
-                        metadata={"source": file_name}
-                    )
-                    documents.append(doc)
-
-            if not documents:
-                return "No valid text found in uploaded documents."
+            collection_name = collection_name or IndexStore.collection_name_for(uploaded_docs)
 
-            # Create embeddings using your helper
-            embeddings = EmbeddingGenerator._get_embedding_model()
+            # Create embeddings using your helper; unchanged chunks are served from the cache
+            embeddings = EmbeddingGenerator.get_cached_embedding_model()
             if embeddings is None:
                 return "Error: Could not create embeddings."
 
-            # Build FAISS vectorstore
-            vectorstore = FAISS.from_documents(documents, embedding=embeddings)
-            AIHelper.temporary_vectorstore = {'vectorstore': vectorstore}
+            # Same document set was indexed before with the same embeddings, reuse the saved index;
+            # one built by another embedding backend is re-indexed
+            if AIHelper.index_store.exists(collection_name):
+                if AIHelper.index_store.matches_embeddings(collection_name, embeddings):
+                    return AIHelper.index_store.get(collection_name, embeddings)
+
+            # Extract, split and embed the files as a pipeline
+            with Metrics.timer("ingest"):
+                texts, vectors, metadatas = IngestPipeline(embeddings).run(uploaded_docs)
+            if not texts:
+                return "No valid text found in uploaded documents."
+
+            # Build FAISS vectorstore with the index type suited to the corpus size
+            with Metrics.timer("index_build"):
+                vectorstore = IndexFactory.build_vectorstore(texts, vectors, metadatas, embeddings)
+            with Metrics.timer("index_save"):
+                AIHelper.index_store.save(collection_name, vectorstore, meta={
+                    "model": IndexStore.embedding_tag(embeddings)[0],
+                    "sources": [file.name for file in uploaded_docs],
+                })
             return vectorstore
         except Exception as e:
             # Get the traceback as a string
@@ -73,11 +118,141 @@ class AIHelper:
             print(f"Exception occurred on line {line_no}")
             return str(e)
 
+    # ---------------- Incremental Updates ----------------
+    @staticmethod
+    def _writable_collection(session_id, embeddings):
+        """
+        Returns the name of the collection the session may change in place.
+        A collection shared with other sessions is forked first so their answers stay the same.
+        """
+        collection_name = AIHelper.session_registry.collection_for(session_id)
+        if collection_name is None:
+            return None
+
+        if AIHelper.session_registry.refcount(collection_name) > 1:
+            forked_name = f"{collection_name}-{uuid.uuid4().hex[:8]}"
+            if AIHelper.index_store.fork(collection_name, forked_name, embeddings) is None:
+                return None
+            AIHelper.session_registry.attach(session_id, forked_name)
+            collection_name = forked_name
+        return collection_name
+
+    @staticmethod
+    def _apply_update(session_id, embeddings, change):
+        """
+        Apply change(delta, meta) to the session's collection through IndexStore.update,
+        which holds the collection's file lock, so an update saved by another process
+        in the meantime is loaded first and never overwritten.
+        Returns (collection_name, vectorstore), or None when the session has no collection
+        """
+        # Threads of this process take turns on forking and updating
+        with AIHelper._update_lock:
+            collection_name = AIHelper._writable_collection(session_id, embeddings)
+            if collection_name is None:
+                return None
+            vectorstore = AIHelper.index_store.update(collection_name, embeddings, change)
+            if vectorstore is None:
+                return None
+            return collection_name, vectorstore
+
+    @staticmethod
+    def _ids_for_sources(vectorstore, sources):
+        sources = set(sources)
+        return [
+            doc_id for doc_id, doc in vectorstore.docstore._dict.items()
+            if doc.metadata.get("source") in sources
+        ]
+
+    @staticmethod
+    def add_documents(session_id, uploaded_docs):
+        """
+        Embed only the given files and add them to the session's collection.
+        A file with the same name as an indexed one replaces it.
+        Returns (collection_name, vectorstore)
+        """
+        try:
+            embeddings = EmbeddingGenerator.get_cached_embedding_model()
+
+            # Parse and embed outside the lock, only the index change is serialized
+            with Metrics.timer("ingest"):
+                texts, vectors, metadatas = IngestPipeline(embeddings).run(uploaded_docs)
+            if not texts:
+                return "No valid text found in uploaded documents."
+
+            new_sources = [file.name for file in uploaded_docs]
+
+            def change(delta, meta):
+                vectorstore = delta.vectorstore
+                # HNSW and IVF rows are tombstoned until enough pile up for a rebuild, flat rows are dropped
+                delta.remove(AIHelper._ids_for_sources(vectorstore, new_sources))
+                delta.add(texts, vectors, metadatas)
+
+                # Move to a larger index type once the collection has outgrown its current one
+                if IndexFactory.choose_mode(vectorstore.index.ntotal) != IndexFactory.mode_of(vectorstore.index):
+                    IndexFactory.rebuild(vectorstore)
+
+                sources = [source for source in meta.get("sources", []) if source not in new_sources]
+                meta["sources"] = sources + new_sources
+
+            result = AIHelper._apply_update(session_id, embeddings, change)
+            return result or "Please re-upload the documents."
+        except Exception as e:
+            # Get the traceback as a string
+            traceback_str = traceback.format_exc()
+            print(traceback_str)
+            # Get the line number of the exception
+            line_no = traceback.extract_tb(e.__traceback__)[-1][1]
+            print(f"Exception occurred on line {line_no}")
+            return str(e)
+
+    @staticmethod
+    def remove_documents(session_id, sources):
+        """
+        Remove every chunk of the given source files from the session's collection.
+        Returns (collection_name, vectorstore)
+        """
+        try:
+            embeddings = EmbeddingGenerator.get_cached_embedding_model()
+
+            def change(delta, meta):
+                delta.remove(AIHelper._ids_for_sources(delta.vectorstore, sources))
+                meta["sources"] = [source for source in meta.get("sources", []) if source not in sources]
+
+            result = AIHelper._apply_update(session_id, embeddings, change)
+            return result or "Please re-upload the documents."
+        except Exception as e:
+            # Get the traceback as a string
+            traceback_str = traceback.format_exc()
+            print(traceback_str)
+            # Get the line number of the exception
+            line_no = traceback.extract_tb(e.__traceback__)[-1][1]
+            print(f"Exception occurred on line {line_no}")
+            return str(e)
+
     # ---------------- Initialize Conversation Chain ----------------
     @staticmethod
-    def initialize_conversation_chain(vectorstore):
+    def _retrieval_chain(llm, retriever, embeddings):
+        """
+        Chain that reranks, packs and stuffs the retrieved chunks into the prompt
+        """
+        def retrieve(query):
+            return AIHelper.reranker.rerank(query, retriever.invoke(query), embeddings)
+
+        # Rerank, then dedupe, merge and budget the chunks before they are stuffed into the prompt
+        packed_retriever = (
+            RunnableLambda(lambda inputs: inputs["input"])
+            | RunnableLambda(retrieve)
+            | RunnableLambda(AIHelper.context_packer.pack)
+        )
+        combine_docs_chain = create_stuff_documents_chain(llm=llm, prompt=AIHelper.prompt)
+        return create_retrieval_chain(packed_retriever, combine_docs_chain)
+
+    @staticmethod
+    def initialize_conversation_chain(vectorstore, keyword_index=None, lock=None):
         """
         vectorstore: FAISS object
+        keyword_index: KeywordIndex over the same chunks, enables hybrid retrieval
+        lock: the collection's ReadWriteLock, when it is updated in place
         Returns a retrieval + LLM chain
         """
         try:
@@ -86,30 +261,100 @@ class AIHelper:
 
             # Get Gemini LLM client
             llm = GeminiLLM.get_chat_llm_client()
+            if isinstance(llm, str):
+                return llm
+            llm = llm.with_config(callbacks=[AIHelper.llm_metrics])
 
-            retriever = vectorstore.as_retriever() if hasattr(vectorstore, "as_retriever") else None
+            # Over-fetch candidates when a reranking stage picks the final few
+            candidates = AIHelper.reranker.candidates
+            if keyword_index is not None:
+                retriever = HybridRetriever(
+                    vectorstore=vectorstore, keyword_index=keyword_index, lock=lock, k=candidates
+                )
+            elif hasattr(vectorstore, "as_retriever"):
+                retriever = vectorstore.as_retriever(search_kwargs={"k": candidates})
+            else:
+                retriever = None
             if not retriever:
                 return "Error: Could not create retriever."
+            return AIHelper._retrieval_chain(llm, retriever, vectorstore.embedding_function)
+        except Exception as e:
+            # Get the traceback as a string
+            traceback_str = traceback.format_exc()
+            print(traceback_str)
+            # Get the line number of the exception
+            line_no = traceback.extract_tb(e.__traceback__)[-1][1]
+            print(f"Exception occurred on line {line_no}")
+            return str(e)
 
-            prompt_template = """
-            1. You are a helpful assistant.
-            2. Give a clear and concise answer.
-            3. If you don't know the answer, say that you don't know. Don't make up an answer.
-            4. If the question is not related to the context, politely respond that you are tuned to the context.
-            5. If the question is inappropriate, respond with a neutral answer.
+    # ---------------- Cached Conversation Chain ----------------
+    @staticmethod
+    def get_conversation_chain(collection_name):
+        """
+        Returns the conversation chain of a collection, building it only when the
+        loaded index or the LLM settings changed since it was last built
+        """
+        vectorstore = AIHelper.get_vectorstore(collection_name)
+        if vectorstore is None:
+            return None
 
-            Context:
-            {context}
+        identity = (id(vectorstore), AIHelper.index_store.generation(collection_name), GeminiLLM.settings())
+        with AIHelper._chain_lock:
+            cached = AIHelper._chain_cache.get(collection_name)
+            if cached and cached[0] == identity:
+                AIHelper._chain_cache.move_to_end(collection_name)
+                return cached[1]
 
-            Question: {input}
+        keyword_index = AIHelper.index_store.get_keyword_index(
+            collection_name, EmbeddingGenerator.get_cached_embedding_model()
+        )
+        conversation_chain = AIHelper.initialize_conversation_chain(
+            vectorstore, keyword_index, AIHelper.index_store.collection_lock(collection_name)
+        )
+        if conversation_chain is None or isinstance(conversation_chain, str):
+            return conversation_chain
 
-            Helpful Answer:
-            """
-            prompt = PromptTemplate.from_template(prompt_template)
+        with AIHelper._chain_lock:
+            AIHelper._chain_cache[collection_name] = (identity, conversation_chain)
+            AIHelper._chain_cache.move_to_end(collection_name)
+            while len(AIHelper._chain_cache) > AIHelper._chain_cache_size:
+                AIHelper._chain_cache.popitem(last=False)
+        return conversation_chain
 
-            combine_docs_chain = create_stuff_documents_chain(llm=llm, prompt=prompt)
-            retrieval_chain = create_retrieval_chain(retriever, combine_docs_chain)
-            return retrieval_chain
+    # ---------------- Federated Chain ----------------
+    @staticmethod
+    def get_federated_chain(collection_names, filters=None):
+        """
+        collection_names: saved collections to search together, at most
+        FederatedRetriever.max_collections of them
+        filters: chunk metadata to match, e.g. {"source": ["leave.pdf", "travel.pdf"]}
+        Returns a retrieval + LLM chain over the merged hits of the collections,
+        or an error message
+        """
+        try:
+            collection_names = list(dict.fromkeys(collection_names or []))
+            if not collection_names:
+                return "Please choose the collections to search."
+            if len(collection_names) > FederatedRetriever.max_collections:
+                return (
+                    f"Too many collections: {len(collection_names)}. "
+                    f"At most {FederatedRetriever.max_collections} can be searched together."
+                )
+            embeddings = EmbeddingGenerator.get_cached_embedding_model()
+
+            llm = GeminiLLM.get_chat_llm_client()
+            if isinstance(llm, str):
+                return llm
+            llm = llm.with_config(callbacks=[AIHelper.llm_metrics])
+
+            retriever = FederatedRetriever(
+                index_store=AIHelper.index_store,
+                embeddings=embeddings,
+                collections=collection_names,
+                filters=filters or {},
+                k=AIHelper.reranker.candidates
+            )
+            return AIHelper._retrieval_chain(llm, retriever, embeddings)
         except Exception as e:
             # Get the traceback as a string
             traceback_str = traceback.format_exc()
@@ -119,23 +364,62 @@ class AIHelper:
             print(f"Exception occurred on line {line_no}")
             return str(e)
 
+    # ---------------- Answer Cache ----------------
+    @staticmethod
+    def _lookup_cached_answer(collection_name, user_query):
+        """
+        Returns (cache_key, cached_answer). cache_key is None when the query
+        could not be embedded, in which case the answer is not cached either.
+        Lexical queries are never cached: they skip the query embedding, and
+        "part AB-1234" and "part AB-1235" are near-identical by cosine similarity.
+        """
+        if KeywordIndex.is_lexical(user_query):
+            return None, None
+
+        query_vector = EmbeddingGenerator.generate_query_embedding(user_query)
+        if not isinstance(query_vector, list):
+            return None, None
+
+        generation = AIHelper.index_store.generation(collection_name)
+        cache_key = (collection_name, generation, user_query, query_vector)
+        return cache_key, AIHelper.answer_cache.lookup(collection_name, generation, query_vector)
+
     # ---------------- Get LLM Response ----------------
     @staticmethod
-    def get_llm_response(user_query):
+    def get_llm_response(user_query, session_id, history=None):
         """
-        Run user query against the current conversation chain
+        Run user query against the conversation chain of the session's collection
         """
-        try:
-            vectorstore = AIHelper.temporary_vectorstore.get('vectorstore', None)
+        collection_name = AIHelper.session_registry.collection_for(session_id)
+        return AIHelper.answer_query(user_query, collection_name, history)
 
-            conversation_chain = AIHelper.initialize_conversation_chain(vectorstore)
+    @staticmethod
+    def answer_query(user_query, collection_name, history=None):
+        """
+        Run user query against the conversation chain of a collection.
+        history: earlier messages of the chat, used to make a follow-up question standalone
+        """
+        try:
+            conversation_chain = AIHelper.get_conversation_chain(collection_name)
             if conversation_chain is None:
                 return "Please re-upload the documents."
             if isinstance(conversation_chain, str):
                 return conversation_chain
 
-            response = conversation_chain.invoke({"input": user_query})
-            llm_response = response.get('answer', 'No response generated.')
+            # Follow-ups are retrieved, cached and answered as their standalone form
+            user_query = AIHelper.query_rewriter.rewrite(user_query, history)
+            with Metrics.timer("answer_cache_lookup"):
+                cache_key, cached_answer = AIHelper._lookup_cached_answer(collection_name, user_query)
+            if cached_answer is not None:
+                return cached_answer
+
+            with Metrics.timer("answer"):
+                response = conversation_chain.invoke({"input": user_query})
+            llm_response = response.get('answer')
+            if not llm_response:
+                return 'No response generated.'
+            if cache_key:
+                AIHelper.answer_cache.store(*cache_key, llm_response)
             return llm_response
         except Exception as e:
             # Get the traceback as a string
@@ -145,4 +429,130 @@ class AIHelper:
             line_no = traceback.extract_tb(e.__traceback__)[-1][1]
             print(f"Exception occurred on line {line_no}")
             return str(e)
-        
\ No newline at end of file
+
+    # ---------------- Stream LLM Response ----------------
+    @staticmethod
+    def stream_llm_response(user_query, session_id, history=None):
+        """
+        Run user query against the session's conversation chain
+        and yield the answer tokens as they arrive
+        """
+        collection_name = AIHelper.session_registry.collection_for(session_id)
+        yield from AIHelper.stream_query(user_query, collection_name, history)
+
+    @staticmethod
+    def stream_query(user_query, collection_name, history=None):
+        """
+        Run user query against the conversation chain of a collection
+        and yield the answer tokens as they arrive.
+        history: earlier messages of the chat, used to make a follow-up question standalone
+        """
+        try:
+            conversation_chain = AIHelper.get_conversation_chain(collection_name)
+            if conversation_chain is None:
+                yield "Please re-upload the documents."
+                return
+            if isinstance(conversation_chain, str):
+                yield conversation_chain
+                return
+
+            # Follow-ups are retrieved, cached and answered as their standalone form
+            user_query = AIHelper.query_rewriter.rewrite(user_query, history)
+            with Metrics.timer("answer_cache_lookup"):
+                cache_key, cached_answer = AIHelper._lookup_cached_answer(collection_name, user_query)
+            if cached_answer is not None:
+                yield cached_answer
+                return
+
+            # Timed by hand: a span must not stay open across yields to the consumer
+            tokens = []
+            started = time.perf_counter()
+            for chunk in conversation_chain.stream({"input": user_query}):
+                token = chunk.get("answer")
+                if token:
+                    tokens.append(token)
+                    yield token
+            Metrics.observe("stage_seconds", time.perf_counter() - started, stage="answer_stream")
+
+            if cache_key and tokens:
+                AIHelper.answer_cache.store(*cache_key, "".join(tokens))
+        except Exception as e:
+            # Get the traceback as a string
+            traceback_str = traceback.format_exc()
+            print(traceback_str)
+            # Get the line number of the exception
+            line_no = traceback.extract_tb(e.__traceback__)[-1][1]
+            print(f"Exception occurred on line {line_no}")
+            yield str(e)
+
+    # ---------------- Federated Query ----------------
+    @staticmethod
+    def answer_federated(user_query, collection_names, filters=None, history=None):
+        """
+        Answer a question from several collections at once, see get_federated_chain.
+        Not served from the answer cache, which is kept per collection.
+        """
+        try:
+            conversation_chain = AIHelper.get_federated_chain(collection_names, filters)
+            if isinstance(conversation_chain, str):
+                return conversation_chain
+
+            user_query = AIHelper.query_rewriter.rewrite(user_query, history)
+            with Metrics.timer("answer", path="federated"):
+                response = conversation_chain.invoke({"input": user_query})
+            return response.get('answer') or 'No response generated.'
+        except Exception as e:
+            # Get the traceback as a string
+            traceback_str = traceback.format_exc()
+            print(traceback_str)
+            # Get the line number of the exception
+            line_no = traceback.extract_tb(e.__traceback__)[-1][1]
+            print(f"Exception occurred on line {line_no}")
+            return str(e)
+
+    @staticmethod
+    def stream_federated(user_query, collection_names, filters=None, history=None):
+        """
+        Same as answer_federated, yielding the answer tokens as they arrive
+        """
+        try:
+            conversation_chain = AIHelper.get_federated_chain(collection_names, filters)
+            if isinstance(conversation_chain, str):
+                yield conversation_chain
+                return
+
+            user_query = AIHelper.query_rewriter.rewrite(user_query, history)
+            # Timed by hand: a span must not stay open across yields to the consumer
+            started = time.perf_counter()
+            for chunk in conversation_chain.stream({"input": user_query}):
+                token = chunk.get("answer")
+                if token:
+                    yield token
+            Metrics.observe("stage_seconds", time.perf_counter() - started, stage="answer_stream", path="federated")
+        except Exception as e:
+            # Get the traceback as a string
+            traceback_str = traceback.format_exc()
+            print(traceback_str)
+            # Get the line number of the exception
+            line_no = traceback.extract_tb(e.__traceback__)[-1][1]
+            print(f"Exception occurred on line {line_no}")
+            yield str(e)
+
+    # ---------------- Metrics ----------------
+    @staticmethod
+    def _collect_metrics():
+        """
+        Cache hit rates and resident state, polled when metrics are exported
+        """
+        caches = {"answer": AIHelper.answer_cache.stats()}
+        if EmbeddingGenerator._cache is not None:
+            caches["embedding"] = EmbeddingGenerator._cache.stats()
+        for cache, stats in caches.items():
+            yield "cache_hits", {"cache": cache}, stats["hits"]
+            yield "cache_misses", {"cache": cache}, stats["misses"]
+            yield "cache_hit_ratio", {"cache": cache}, stats["hit_rate"]
+        yield "loaded_collections", {}, len(AIHelper.index_store._loaded)
+        yield "sessions", {}, len(AIHelper.session_registry._sessions)
+
+
+Metrics.register_collector(AIHelper._collect_metrics)
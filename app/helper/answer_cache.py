@@ -0,0 +1,94 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    In-memory answer cache for repeated and near-duplicate questions.
+    - Entries are grouped per collection and tagged with the index generation,
+      so any change to the index drops the collection's cached answers
+    - A lookup hits when the cosine similarity between the query embedding and a
+      cached query embedding reaches the threshold
+    - Entries expire after ttl seconds and the least recently used ones are
+      evicted beyond max_entries per collection
+    """
+
+    def __init__(self, threshold=None, ttl=None, max_entries=None):
+        self.threshold = float(threshold or os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+        self.ttl = float(ttl or os.getenv("ANSWER_CACHE_TTL", 3600))
+        self.max_entries = int(max_entries or os.getenv("ANSWER_CACHE_MAX_ENTRIES", 256))
+        self.hits = 0
+        self.misses = 0
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _entries(self, collection_name, generation):
+        # Caller holds the lock
+        collection = self._collections.get(collection_name)
+        if collection is None or collection["generation"] != generation:
+            collection = {"generation": generation, "entries": OrderedDict()}
+            self._collections[collection_name] = collection
+        return collection["entries"]
+
+    # ---------------- Lookup ----------------
+    def lookup(self, collection_name, generation, query_vector):
+        """
+        Returns the cached answer of the most similar earlier question, or None
+        """
+        query = self._normalize(query_vector)
+        now = time.time()
+        with self._lock:
+            entries = self._entries(collection_name, generation)
+            for key in [key for key, entry in entries.items() if now - entry["created_at"] > self.ttl]:
+                del entries[key]
+
+            if entries:
+                keys = list(entries)
+                similarities = np.vstack([entries[key]["vector"] for key in keys]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entries.move_to_end(keys[best])
+                    self.hits += 1
+                    return entries[keys[best]]["answer"]
+
+            self.misses += 1
+            return None
+
+    # ---------------- Store ----------------
+    def store(self, collection_name, generation, query, query_vector, answer):
+        with self._lock:
+            entries = self._entries(collection_name, generation)
+            entries[query] = {
+                "vector": self._normalize(query_vector),
+                "answer": answer,
+                "created_at": time.time(),
+            }
+            entries.move_to_end(query)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def invalidate(self, collection_name):
+        with self._lock:
+            self._collections.pop(collection_name, None)
+
+    # ---------------- Stats ----------------
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "collections": len(self._collections),
+                "entries": sum(len(collection["entries"]) for collection in self._collections.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,325 @@
+import os
+import time
+import uuid
+import pickle
+import hashlib
+import sqlite3
+import threading
+import traceback
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+CACHE_DIR = os.getenv("DOCSQUERY_CACHE_DIR", ".cache")
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache backed by SQLite.
+    Rows are keyed by (model name, output dim, task type, sha256 of chunk text)
+    and the least recently used rows are evicted once max_entries is exceeded.
+    Writes add to a running count, taken once at open, instead of counting the table
+    each time; only once that crosses max_entries is the table counted, which also picks
+    up rows other processes wrote, and trimmed to evict_to of max_entries.
+    """
+    evict_to = 0.9
+
+    # SQLite caps the number of bound parameters per statement
+    _query_batch_size = 500
+
+    def __init__(self, path=None, max_entries=None):
+        self.path = path or os.getenv("EMBEDDING_CACHE_PATH", os.path.join(CACHE_DIR, "embeddings.sqlite3"))
+        self.max_entries = int(max_entries or os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 500_000))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    # ---------------- Keys ----------------
+    @staticmethod
+    def make_key(model_name, output_dim, task_type, text):
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model_name}|{output_dim}|{task_type}|{text_hash}"
+
+    # ---------------- Read ----------------
+    def get_many(self, keys):
+        """
+        keys: list of cache keys
+        Returns a dict of key -> embedding (list of floats) for the keys found
+        """
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(unique_keys), self._query_batch_size):
+                batch = unique_keys[start:start + self._query_batch_size]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows]
+                    )
+            self._conn.commit()
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    # ---------------- Write ----------------
+    def put_many(self, items):
+        """
+        items: dict of key -> embedding
+        """
+        if not items:
+            return
+        now = time.time()
+        rows = [
+            (key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)", rows
+            )
+            self._count += len(rows)
+            if self._count > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Other processes sharing the file write to it too, so the count is only exact here
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = count - int(self.max_entries * self.evict_to) if count > self.max_entries else 0
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                "SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.evictions += overflow
+        self._count = count - max(overflow, 0)
+
+    # ---------------- Stats ----------------
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings wrapper that serves vectors from an EmbeddingCache
+    and only sends cache misses to the underlying embedding backend.
+    """
+
+    def __init__(self, backend, cache, model_name, output_dim,
+                 document_task_type="RETRIEVAL_DOCUMENT", query_task_type="RETRIEVAL_QUERY"):
+        self.backend = backend
+        self.cache = cache
+        self.model_name = model_name
+        self.output_dim = output_dim
+        self.document_task_type = document_task_type
+        self.query_task_type = query_task_type
+
+    def _key(self, task_type, text):
+        return EmbeddingCache.make_key(self.model_name, self.output_dim, task_type, text)
+
+    def embed_documents(self, texts):
+        keys = [self._key(self.document_task_type, text) for text in texts]
+        try:
+            cached = self.cache.get_many(keys)
+        except sqlite3.Error:
+            # A broken cache must never block ingest
+            print(traceback.format_exc())
+            cached = {}
+
+        # Deduplicate misses so repeated chunks are only embedded once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            missing_keys = list(missing.keys())
+            kwargs = {"task_type": self.document_task_type, "output_dimensionality": self.output_dim}
+            if getattr(self.backend, "supports_partial_results", False):
+                # Persist each batch as it lands, so an interrupted ingest resumes where it stopped
+                kwargs["on_batch"] = lambda indexes, vectors: self._store({
+                    missing_keys[index]: vector for index, vector in zip(indexes, vectors)
+                })
+            vectors = self.backend.embed_documents(list(missing.values()), **kwargs)
+            fresh = dict(zip(missing_keys, vectors))
+            if "on_batch" not in kwargs:
+                self._store(fresh)
+            cached.update(fresh)
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text):
+        key = self._key(self.query_task_type, text)
+        try:
+            cached = self.cache.get_many([key])
+        except sqlite3.Error:
+            print(traceback.format_exc())
+            cached = {}
+        if key in cached:
+            return cached[key]
+
+        vector = self.backend.embed_query(
+            text,
+            task_type=self.query_task_type,
+            output_dimensionality=self.output_dim
+        )
+        self._store({key: vector})
+        return vector
+
+    def _store(self, items):
+        try:
+            self.cache.put_many(items)
+        except sqlite3.Error:
+            print(traceback.format_exc())
+
+
+class ExtractionCache:
+    """
+    Content-addressed disk cache of extracted document segments.
+    Entries are keyed by the sha256 of the uploaded bytes, the file extension and
+    the extractor version. Each is one file of consecutive pickles, one per segment,
+    written and read back a segment at a time, and the least recently used files
+    are deleted once the directory grows past max_bytes. Writes add to a running
+    total, measured once, instead of scanning the directory each time; only once that
+    crosses max_bytes is it scanned and trimmed to evict_to of max_bytes.
+    """
+    evict_to = 0.9
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or os.getenv("EXTRACTION_CACHE_DIR", os.path.join(CACHE_DIR, "extracted"))
+        self.max_bytes = int(max_bytes or int(os.getenv("EXTRACTION_CACHE_MAX_MB", 1024)) * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._bytes = None
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def make_key(data, ext, extractor_version):
+        return f"{hashlib.sha256(data).hexdigest()}-{ext}-v{extractor_version}"
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.pkl")
+
+    # ---------------- Read ----------------
+    def get_stream(self, key):
+        """
+        Iterator over the cached segments of key, or None when it is not cached
+        """
+        path = self._path(key)
+        try:
+            cache_file = open(path, "rb")
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        # Bump mtime so eviction sees this entry as recently used
+        os.utime(path)
+        self.hits += 1
+        return self._read_stream(cache_file)
+
+    @staticmethod
+    def _read_stream(cache_file):
+        with cache_file:
+            while True:
+                try:
+                    yield pickle.load(cache_file)
+                except EOFError:
+                    return
+
+    # ---------------- Write ----------------
+    def put_stream(self, key, items):
+        """
+        Yields items while appending them to a new entry for key. The entry only
+        appears once items is exhausted, so an abandoned or failed extraction
+        never leaves a partial one.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a unique temp name and rename, so concurrent workers never read a partial file
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as cache_file:
+                for item in items:
+                    pickle.dump(item, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+                    yield item
+                size = cache_file.tell()
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        if self._bytes is None:
+            self._bytes = sum(size for _, size, _ in self._entries())
+        else:
+            self._bytes += size
+        if self._bytes > self.max_bytes:
+            self._evict()
+
+    def _entries(self):
+        entries = []
+        for bucket in os.scandir(self.root):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.endswith(".pkl"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        # Other processes write to the directory too, so the total is only exact here
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes * self.evict_to:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        self._bytes = total
+
+    # ---------------- Stats ----------------
+    def stats(self):
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
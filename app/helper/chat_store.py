@@ -0,0 +1,149 @@
+import os
+import time
+import zlib
+import sqlite3
+import threading
+
+from app.helper.cache_helper import CACHE_DIR
+
+
+class ChatStore:
+    """
+    Persistent chat history backed by SQLite.
+    1. A chat row keeps its title and message count, so the sidebar never reads messages
+    2. Messages are compact records keyed by (chat_id, seq): the role is a small int and
+       long contents are zlib-compressed
+    3. Chats and messages are read a page at a time, newest first
+    """
+    roles = ("user", "assistant")
+    # Contents shorter than this are stored as plain text; compression does not pay off
+    _compress_min_bytes = 512
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("CHAT_STORE_PATH", os.path.join(CACHE_DIR, "chats.sqlite3"))
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chats ("
+            "id INTEGER PRIMARY KEY, owner TEXT NOT NULL, title TEXT NOT NULL, collection TEXT, "
+            "message_count INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chats_owner_updated ON chats(owner, updated_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "chat_id INTEGER NOT NULL REFERENCES chats(id) ON DELETE CASCADE, seq INTEGER NOT NULL, "
+            "role INTEGER NOT NULL, content BLOB NOT NULL, PRIMARY KEY (chat_id, seq)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    # ---------------- Encoding ----------------
+    @staticmethod
+    def _encode(content):
+        data = content.encode("utf-8")
+        if len(data) < ChatStore._compress_min_bytes:
+            return content
+        return zlib.compress(data)
+
+    @staticmethod
+    def _decode(content):
+        if isinstance(content, bytes):
+            return zlib.decompress(content).decode("utf-8")
+        return content
+
+    # ---------------- Chats ----------------
+    def create_chat(self, owner, title, collection=None):
+        """
+        Returns the id of a new, empty chat
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO chats (owner, title, collection, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (owner, title, collection, now, now)
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def list_chats(self, owner, offset=0, limit=20):
+        """
+        Returns one page of the owner's chats, most recently updated first,
+        as dicts of id, title, collection, message_count and updated_at
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, title, collection, message_count, updated_at FROM chats "
+                "WHERE owner = ? ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+                (owner, limit, offset)
+            ).fetchall()
+        return [
+            {"id": chat_id, "title": title, "collection": collection, "message_count": count, "updated_at": updated_at}
+            for chat_id, title, collection, count, updated_at in rows
+        ]
+
+    def count_chats(self, owner):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chats WHERE owner = ?", (owner,)).fetchone()[0]
+
+    def get_chat(self, chat_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, title, collection, message_count, updated_at FROM chats WHERE id = ?", (chat_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("id", "title", "collection", "message_count", "updated_at"), row))
+
+    def delete_chat(self, chat_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
+            self._conn.commit()
+
+    # ---------------- Messages ----------------
+    def append_messages(self, chat_id, messages):
+        """
+        messages: list of {"role": "user" | "assistant", "content": str}
+        """
+        if not messages:
+            return
+        with self._lock:
+            count = self._conn.execute(
+                "SELECT message_count FROM chats WHERE id = ?", (chat_id,)
+            ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT INTO messages (chat_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                [
+                    (chat_id, count + offset, self.roles.index(message["role"]), self._encode(message["content"]))
+                    for offset, message in enumerate(messages)
+                ]
+            )
+            self._conn.execute(
+                "UPDATE chats SET message_count = ?, updated_at = ? WHERE id = ?",
+                (count + len(messages), time.time(), chat_id)
+            )
+            self._conn.commit()
+
+    def get_messages(self, chat_id, limit=50, before=None):
+        """
+        Returns up to `limit` messages of a chat in order, the latest ones
+        before sequence number `before` (the end of the chat by default)
+        """
+        with self._lock:
+            if before is None:
+                rows = self._conn.execute(
+                    "SELECT role, content FROM messages WHERE chat_id = ? ORDER BY seq DESC LIMIT ?",
+                    (chat_id, limit)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT role, content FROM messages WHERE chat_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                    (chat_id, before, limit)
+                ).fetchall()
+        return [
+            {"role": self.roles[role], "content": self._decode(content)}
+            for role, content in reversed(rows)
+        ]
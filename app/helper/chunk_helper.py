@@ -0,0 +1,174 @@
+import os
+from collections import deque
+
+from app.helper.token_helper import TokenCounter
+
+
+class ChunkHelper:
+    """
+    Structure-aware chunking, sized in tokens.
+    Each format is mapped to a strategy that knows its structure:
+    - pages: pdf text flows across pages, chunks record the pages they span
+    - slides: whole slides are packed together, a slide is only split when it
+      alone exceeds the budget
+    - rows: row groups from the table extractors, split by rows when over budget
+    - text: line windows for formats without structure
+    Lines longer than the budget are cut at token boundaries. Every chunk stores
+    its token_count in metadata, so context packing never re-tokenizes it.
+    Strategies are functions (segments, source) -> iterable of (text, metadata),
+    added with ChunkHelper.register.
+    """
+    chunk_tokens = int(os.getenv("CHUNK_TOKENS", 250))
+    chunk_overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", 50))
+
+    strategies = {}
+    format_strategies = {
+        "pdf": "pages",
+        "ppt": "slides",
+        "pptx": "slides",
+        "csv": "rows",
+        "xls": "rows",
+        "xlsx": "rows",
+    }
+    default_strategy = "text"
+
+    # ---------------- Registry ----------------
+    @classmethod
+    def register(cls, name, strategy, formats=()):
+        cls.strategies[name] = strategy
+        for ext in formats:
+            cls.format_strategies[ext] = name
+
+    @staticmethod
+    def split(segments, source, ext):
+        """
+        segments: (text, metadata) iterable from DocumentHelper.extract_segments,
+        consumed once as the chunks are yielded
+        Yields (chunk_text, metadata) using the strategy registered for ext
+        """
+        name = ChunkHelper.format_strategies.get(ext, ChunkHelper.default_strategy)
+        return ChunkHelper.strategies[name](segments, source)
+
+    # ---------------- Line Windows ----------------
+    @staticmethod
+    def _lines(text, chunk_tokens):
+        """
+        Yields (line, tokens) for the non-empty lines of text, cutting overlong lines
+        """
+        for line in text.split("\n"):
+            line = line.strip()
+            if not line:
+                continue
+            tokens = TokenCounter.count(line)
+            if tokens <= chunk_tokens:
+                yield line, tokens
+                continue
+            for piece in TokenCounter.split(line, chunk_tokens):
+                piece = piece.strip()
+                if piece:
+                    yield piece, TokenCounter.count(piece)
+
+    @staticmethod
+    def _make_chunk(window, source, unit_key):
+        text = "\n".join(line for line, _, _ in window)
+        metadata = {"source": source}
+        first_unit, last_unit = window[0][1], window[-1][1]
+        if unit_key and first_unit is not None:
+            metadata[unit_key] = first_unit
+            if last_unit != first_unit:
+                metadata[f"{unit_key}_end"] = last_unit
+        metadata["token_count"] = TokenCounter.count(text)
+        return text, metadata
+
+    @staticmethod
+    def split_units(units, source, unit_key=None, pack_units=False, chunk_tokens=None, chunk_overlap_tokens=None):
+        """
+        units: iterable of (unit_number, text), e.g. pages or slides; unit_number may be None
+        unit_key: metadata key for the unit range ("page" -> page / page_end)
+        pack_units: start a new chunk, without overlap, whenever the next unit does not
+        fit whole in the current one, so units are only split when they are oversized
+        Yields (chunk_text, metadata)
+        """
+        chunk_tokens = chunk_tokens or ChunkHelper.chunk_tokens
+        overlap = ChunkHelper.chunk_overlap_tokens if chunk_overlap_tokens is None else chunk_overlap_tokens
+
+        # window_tokens counts the window's lines plus one token per joining newline
+        window = deque()
+        window_tokens = 0
+        for unit_number, text in units:
+            lines = list(ChunkHelper._lines(text, chunk_tokens))
+            if pack_units and window:
+                unit_tokens = sum(tokens for _, tokens in lines) + len(lines)
+                if window_tokens + unit_tokens > chunk_tokens:
+                    yield ChunkHelper._make_chunk(window, source, unit_key)
+                    window.clear()
+                    window_tokens = 0
+
+            for line, tokens in lines:
+                if window and window_tokens + 1 + tokens > chunk_tokens:
+                    yield ChunkHelper._make_chunk(window, source, unit_key)
+                    # Keep trailing lines as overlap, as long as the next line still fits
+                    while window and (
+                        window_tokens > overlap
+                        or window_tokens + 1 + tokens > chunk_tokens
+                    ):
+                        _, _, removed = window.popleft()
+                        window_tokens -= removed + (1 if window else 0)
+
+                window_tokens += tokens + (1 if window else 0)
+                window.append((line, unit_number, tokens))
+
+        if window:
+            yield ChunkHelper._make_chunk(window, source, unit_key)
+
+    # ---------------- Strategies ----------------
+    @staticmethod
+    def split_pages(segments, source):
+        pages = ((metadata.get("page"), text) for text, metadata in segments)
+        return ChunkHelper.split_units(pages, source, unit_key="page")
+
+    @staticmethod
+    def split_slides(segments, source):
+        slides = ((metadata.get("slide"), text) for text, metadata in segments)
+        return ChunkHelper.split_units(slides, source, unit_key="slide", pack_units=True)
+
+    @staticmethod
+    def split_text(segments, source):
+        return ChunkHelper.split_units(((None, text) for text, _ in segments), source)
+
+    @staticmethod
+    def split_rows(segments, source):
+        """
+        Row groups pass through when they fit the budget; larger ones are split
+        between rows, keeping the data row range of each piece
+        """
+        chunk_tokens = ChunkHelper.chunk_tokens
+        for text, metadata in segments:
+            tokens = TokenCounter.count(text)
+            if tokens <= chunk_tokens or "row_start" not in metadata:
+                yield text, {"source": source, **metadata, "token_count": tokens}
+                continue
+
+            rows = text.split("\n")
+            group, group_tokens, group_start = [], 0, 0
+            for row_index, row in enumerate(rows + [None]):
+                row_tokens = TokenCounter.count(row) if row is not None else 0
+                if group and (row is None or group_tokens + 1 + row_tokens > chunk_tokens):
+                    group_text = "\n".join(group)
+                    yield group_text, {
+                        "source": source,
+                        **metadata,
+                        "row_start": metadata["row_start"] + group_start,
+                        "row_end": metadata["row_start"] + row_index - 1,
+                        "token_count": TokenCounter.count(group_text),
+                    }
+                    group, group_tokens, group_start = [], 0, row_index
+                if row is not None:
+                    group_tokens += row_tokens + (1 if group else 0)
+                    group.append(row)
+
+
+ChunkHelper.register("pages", ChunkHelper.split_pages)
+ChunkHelper.register("slides", ChunkHelper.split_slides)
+ChunkHelper.register("rows", ChunkHelper.split_rows)
+ChunkHelper.register("text", ChunkHelper.split_text)
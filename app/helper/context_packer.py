@@ -0,0 +1,160 @@
+import os
+import threading
+
+from langchain_core.documents import Document
+
+from app.helper.metrics_helper import Metrics
+from app.helper.token_helper import TokenCounter
+
+
+class ContextPacker:
+    """
+    Assembles retrieved chunks into the prompt context:
+    1. Chunks contained in another chunk of the same source are dropped
+    2. Chunks of the same source that overlap (the chunker's trailing-line overlap)
+       or continue each other's row range are merged into one
+    3. The result is packed in retrieval order up to a token budget
+    """
+
+    def __init__(self, token_budget=None, min_fragment_tokens=64):
+        self.token_budget = int(token_budget or os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+        self.min_fragment_tokens = min_fragment_tokens
+        self.queries = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self._lock = threading.Lock()
+
+    # ---------------- Token Counts ----------------
+    @staticmethod
+    def _tokens(doc):
+        # Chunks carry their token count from ingest; merged ones are recounted
+        token_count = doc.metadata.get("token_count")
+        return token_count if token_count is not None else TokenCounter.count(doc.page_content)
+
+    # ---------------- Merging ----------------
+    @staticmethod
+    def _overlap_merge(first, second):
+        """
+        Returns first + second without the lines second repeats from the end of first,
+        or None when second does not continue first
+        """
+        first_lines, second_lines = first.split("\n"), second.split("\n")
+        for size in range(min(len(first_lines), len(second_lines)), 0, -1):
+            if first_lines[-size:] == second_lines[:size]:
+                return "\n".join(first_lines + second_lines[size:])
+        return None
+
+    @staticmethod
+    def _merged_metadata(first, second):
+        metadata = dict(first)
+        metadata.pop("token_count", None)
+        for start, end in (("page", "page_end"), ("row_start", "row_end")):
+            values = [
+                value for value in (first.get(start), first.get(end), second.get(start), second.get(end))
+                if value is not None
+            ]
+            if values:
+                metadata[start] = min(values)
+                if max(values) != metadata[start]:
+                    metadata[end] = max(values)
+                else:
+                    metadata.pop(end, None)
+        return metadata
+
+    @staticmethod
+    def _combine(first, second):
+        """
+        Returns one Document holding both chunks, or None if they are unrelated
+        """
+        a, b = first.page_content, second.page_content
+        if b in a:
+            return first
+        if a in b:
+            return second
+
+        text = ContextPacker._overlap_merge(a, b)
+        if text is None:
+            # Consecutive row groups of the same table / sheet
+            if (
+                first.metadata.get("row_end") is not None
+                and first.metadata.get("sheet") == second.metadata.get("sheet")
+                and second.metadata.get("row_start") == first.metadata["row_end"] + 1
+            ):
+                text = a + "\n" + b
+            else:
+                return None
+        return Document(page_content=text, metadata=ContextPacker._merged_metadata(first.metadata, second.metadata))
+
+    @staticmethod
+    def merge(documents):
+        """
+        documents: retrieved Documents, best first
+        Returns the deduplicated and merged Documents, ordered by their best rank
+        """
+        groups = {}
+        for rank, doc in enumerate(documents):
+            groups.setdefault(doc.metadata.get("source"), []).append([rank, doc])
+
+        merged = []
+        for items in groups.values():
+            changed = True
+            while changed:
+                changed = False
+                for i in range(len(items)):
+                    for j in range(len(items)):
+                        if i == j:
+                            continue
+                        combined = ContextPacker._combine(items[i][1], items[j][1])
+                        if combined is not None:
+                            items[i] = [min(items[i][0], items[j][0]), combined]
+                            del items[j]
+                            changed = True
+                            break
+                    if changed:
+                        break
+            merged.extend(items)
+        return [doc for _, doc in sorted(merged, key=lambda item: item[0])]
+
+    # ---------------- Packing ----------------
+    def pack(self, documents):
+        """
+        Returns the merged Documents that fit the token budget, truncating the
+        first one that does not fit when enough of the budget is left for it
+        """
+        with Metrics.timer("pack"):
+            tokens_in = sum(self._tokens(doc) for doc in documents)
+
+            packed, used = [], 0
+            for doc in self.merge(documents):
+                tokens = self._tokens(doc)
+                if used + tokens <= self.token_budget:
+                    packed.append(doc)
+                    used += tokens
+                    continue
+                remaining = self.token_budget - used
+                if remaining >= self.min_fragment_tokens:
+                    text = TokenCounter.truncate(doc.page_content, remaining)
+                    metadata = {**doc.metadata, "truncated": True}
+                    metadata.pop("token_count", None)
+                    packed.append(Document(page_content=text, metadata=metadata))
+                    used += TokenCounter.count(text)
+                break
+
+        with self._lock:
+            self.queries += 1
+            self.tokens_in += tokens_in
+            self.tokens_out += used
+        Metrics.increment("tokens_total", tokens_in, kind="context_in")
+        Metrics.increment("tokens_total", used, kind="context_out")
+        Metrics.increment("chunks_total", len(packed), stage="pack")
+        return packed
+
+    # ---------------- Stats ----------------
+    def stats(self):
+        with self._lock:
+            return {
+                "queries": self.queries,
+                "tokens_in": self.tokens_in,
+                "tokens_out": self.tokens_out,
+                "tokens_saved": self.tokens_in - self.tokens_out,
+            }
@@ -1,4 +1,8 @@
+import io
+import os
 import tempfile
+import threading
+import time
 import traceback
 
 import docx
@@ -8,37 +12,134 @@ from PyPDF2 import PdfReader
 from odf.opendocument import load
 from odf.text import P
 from striprtf.striprtf import rtf_to_text
-from spire.presentation import Presentation, FileFormat
+from spire.presentation import Presentation, FileFormat, Stream
 from spire.doc import Document as SpireDocument
 from spire.doc import FileFormat as SpireFileFormat
+from spire.doc import Stream as SpireDocStream
 from spire.xls import Workbook as SpireWorkbook
 from spire.xls import ExcelVersion
+from spire.xls import FileFormat as SpireXlsFileFormat
+from spire.xls import Stream as SpireXlsStream
+
+from app.helper.cache_helper import ExtractionCache
+from app.helper.metrics_helper import Metrics
+
+
+class UploadedBytes(io.BytesIO):
+    """In-memory file with a name, used to hand uploads to worker processes."""
+
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
 
 
 class DocumentHelper:
     """Helper class to extract text from multiple document formats."""
 
+    supported_formats = (
+        "pdf", "doc", "docx", "txt", "ppt", "pptx",
+        "odt", "rtf", "csv", "xls", "xlsx"
+    )
+
+    # ---------------- Legacy Conversion ----------------
+    legacy_formats = ("doc", "ppt", "xls")
+    # Spire conversions are slow and memory hungry, bound how many run at once per process
+    _conversion_slots = threading.BoundedSemaphore(int(os.getenv("LEGACY_CONVERSION_CONCURRENCY", 2)))
+    # Sheet added by unlicensed Spire.XLS to converted workbooks
+    _spire_evaluation_sheet = "Evaluation Warning"
+
+    @staticmethod
+    def _scratch_dir():
+        # Prefer tmpfs so the fallback conversion never touches the disk
+        if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+            return "/dev/shm"
+        return None
+
+    @staticmethod
+    def _convert_in_memory(data, ext):
+        # Each Spire package only accepts its own Stream type
+        if ext == "doc":
+            output = SpireDocStream()
+            document = SpireDocument()
+            document.LoadFromStream(SpireDocStream(data), SpireFileFormat.Doc)
+            document.SaveToStream(output, SpireFileFormat.Docx2019)
+            document.Close()
+        elif ext == "ppt":
+            output = Stream()
+            presentation = Presentation()
+            presentation.LoadFromStream(Stream(data), FileFormat.PPT)
+            presentation.SaveToFile(output, FileFormat.Pptx2019)
+            presentation.Dispose()
+        else:
+            output = SpireXlsStream()
+            workbook = SpireWorkbook()
+            workbook.LoadFromStream(SpireXlsStream(data))
+            workbook.SaveToStream(output, SpireXlsFileFormat.Version2016)
+            workbook.Dispose()
+        return bytes(output.ToArray())
+
+    @staticmethod
+    def _convert_on_disk(data, ext):
+        # The scratch directory and both files are removed when the block exits
+        with tempfile.TemporaryDirectory(dir=DocumentHelper._scratch_dir()) as scratch:
+            source_path = os.path.join(scratch, f"source.{ext}")
+            target_path = os.path.join(scratch, f"converted.{ext}x")
+            with open(source_path, "wb") as source_file:
+                source_file.write(data)
+
+            if ext == "doc":
+                document = SpireDocument()
+                document.LoadFromFile(source_path)
+                document.SaveToFile(target_path, SpireFileFormat.Docx2019)
+                document.Close()
+            elif ext == "ppt":
+                presentation = Presentation()
+                presentation.LoadFromFile(source_path)
+                presentation.SaveToFile(target_path, FileFormat.Pptx2019)
+                presentation.Dispose()
+            else:
+                workbook = SpireWorkbook()
+                workbook.LoadFromFile(source_path)
+                workbook.SaveToFile(target_path, ExcelVersion.Version2016)
+                workbook.Dispose()
+
+            with open(target_path, "rb") as target_file:
+                return target_file.read()
+
+    @staticmethod
+    def convert_legacy(file, ext):
+        """
+        Convert a doc, ppt or xls upload to docx, pptx or xlsx with Spire.
+        Converts through in-memory streams, falling back to a scratch directory.
+        Returns a file-like object of the converted document
+        """
+        data = file.read()
+        with DocumentHelper._conversion_slots:
+            try:
+                converted = DocumentHelper._convert_in_memory(data, ext)
+            except Exception:
+                print(traceback.format_exc())
+                converted = DocumentHelper._convert_on_disk(data, ext)
+        return io.BytesIO(converted)
+
     # ---------------- PDF ----------------
     @staticmethod
-    def extract_pdf(file):
+    def iter_pdf_pages(file):
+        """
+        Yields (page_number, text) one page at a time, starting at 1
+        """
         pdf_reader = PdfReader(file)
-        return "\n".join(
-            page.extract_text() or "" for page in pdf_reader.pages
-        )
+        for page_number, page in enumerate(pdf_reader.pages, start=1):
+            yield page_number, page.extract_text() or ""
+
+    @staticmethod
+    def extract_pdf(file):
+        return "\n".join(text for _, text in DocumentHelper.iter_pdf_pages(file))
 
     # ---------------- DOC ----------------
     @staticmethod
     def extract_doc(file):
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".doc") as tmp_file:
-            tmp_file.write(file.read())
-            tmp_file_path = tmp_file.name
-
-        document = SpireDocument()
-        document.LoadFromFile(tmp_file_path)
-        document.SaveToFile(tmp_file_path, SpireFileFormat.Docx2019)
-        document.Close()
-
-        doc = docx.Document(tmp_file_path)
+        doc = docx.Document(DocumentHelper.convert_legacy(file, "doc"))
         return "\n".join([para.text for para in doc.paragraphs])
 
     # ---------------- DOCX ----------------
@@ -55,27 +156,25 @@ class DocumentHelper:
     # ---------------- PPT ----------------
     @staticmethod
     def extract_ppt(file):
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".ppt") as tmp_file:
-            tmp_file.write(file.read())
-            tmp_file_path = tmp_file.name
-
-        pre = Presentation()
-        pre.LoadFromFile(tmp_file_path)
-        pre.SaveToFile(tmp_file_path, FileFormat.Pptx2019)
-        pre.Dispose()
-
-        return DocumentHelper.extract_pptx(open(tmp_file_path, "rb"))
+        return DocumentHelper.extract_pptx(DocumentHelper.convert_legacy(file, "ppt"))
 
     # ---------------- PPTX ----------------
     @staticmethod
-    def extract_pptx(file):
+    def iter_pptx_slides(file):
+        """
+        Yields (slide_number, text) for every slide, starting at 1
+        """
         presentation = pptx.Presentation(file)
-        text = ""
-        for slide in presentation.slides:
+        for slide_number, slide in enumerate(presentation.slides, start=1):
+            text = ""
             for shape in slide.shapes:
                 if hasattr(shape, "text"):
                     text += shape.text + "\n"
-        return text
+            yield slide_number, text
+
+    @staticmethod
+    def extract_pptx(file):
+        return "".join(text for _, text in DocumentHelper.iter_pptx_slides(file))
 
     # ---------------- ODT ----------------
     @staticmethod
@@ -100,42 +199,173 @@ class DocumentHelper:
         rtf_content = file.read()
         return rtf_to_text(rtf_content.decode("latin-1"))
 
+    # ---------------- Tables ----------------
+    table_formats = ("csv", "xls", "xlsx")
+    csv_chunk_rows = 50_000
+    table_chunk_size = 1000
+
+    @staticmethod
+    def _format_rows(df):
+        """
+        Format every row as "col: value, col: value" column by column,
+        instead of building a Series per row with iterrows
+        """
+        if df.empty or len(df.columns) == 0:
+            return pd.Series([], dtype=object)
+        columns = iter(df.columns)
+        first = next(columns)
+        rows = f"{first}: " + df[first].astype(str)
+        for col in columns:
+            rows = rows + f", {col}: " + df[col].astype(str)
+        return rows
+
+    @staticmethod
+    def iter_row_groups(frames, sheet=None, chunk_size=None):
+        """
+        frames: iterable of DataFrames (CSV chunks or whole sheets)
+        Yields (text, metadata) for consecutive rows packed up to chunk_size characters,
+        with the sheet name and 1-based data row range in metadata
+        """
+        chunk_size = chunk_size or DocumentHelper.table_chunk_size
+        row_offset = 0
+        for df in frames:
+            rows = DocumentHelper._format_rows(df).tolist()
+            if not rows:
+                continue
+
+            # Greedily pack consecutive rows while the joined text stays within chunk_size
+            boundaries = [0]
+            group_length = 0
+            for row_index, row in enumerate(rows):
+                if row_index > boundaries[-1] and group_length + len(row) + 1 > chunk_size:
+                    boundaries.append(row_index)
+                    group_length = 0
+                group_length += len(row) + 1
+            boundaries.append(len(rows))
+
+            for start, end in zip(boundaries, boundaries[1:]):
+                metadata = {"row_start": row_offset + start + 1, "row_end": row_offset + end}
+                if sheet is not None:
+                    metadata["sheet"] = sheet
+                yield "\n".join(rows[start:end]), metadata
+            row_offset += len(rows)
+
+    @staticmethod
+    def iter_table_chunks(file, ext):
+        """
+        Yields (text, metadata) row groups of a csv, xls or xlsx file.
+        CSV is read in chunks of csv_chunk_rows rows so huge files stream;
+        every sheet of a workbook is read.
+        """
+        if ext == "csv":
+            yield from DocumentHelper.iter_row_groups(
+                pd.read_csv(file, chunksize=DocumentHelper.csv_chunk_rows)
+            )
+            return
+
+        workbook = DocumentHelper.convert_legacy(file, "xls") if ext == "xls" else file
+        for sheet, df in pd.read_excel(workbook, sheet_name=None).items():
+            if ext == "xls" and sheet == DocumentHelper._spire_evaluation_sheet:
+                continue
+            yield from DocumentHelper.iter_row_groups([df], sheet=sheet)
+
     # ---------------- CSV ----------------
     @staticmethod
     def extract_csv(file):
-        df = pd.read_csv(file)
-        rows = [
-            ", ".join(f"{col}: {row[col]}" for col in df.columns)
-            for _, row in df.iterrows()
-        ]
-        return "\n".join(rows)
+        return "\n".join(text for text, _ in DocumentHelper.iter_table_chunks(file, "csv"))
 
     # ---------------- XLS ----------------
     @staticmethod
     def extract_xls(file):
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".xls") as tmp_file:
-            tmp_file.write(file.read())
-            tmp_file_path = tmp_file.name
-
-        workbook = SpireWorkbook()
-        workbook.LoadFromFile(tmp_file_path)
-        workbook.SaveToFile(tmp_file_path, ExcelVersion.Version2016)
-        workbook.Dispose()
-
-        df = pd.read_excel(tmp_file_path)
-        return "\n".join(
-            [", ".join([f"{col}: {str(row[col])}" for col in df.columns]) for _, row in df.iterrows()]
-        )
+        return "\n".join(text for text, _ in DocumentHelper.iter_table_chunks(file, "xls"))
 
     # ---------------- XLSX ----------------
     @staticmethod
     def extract_xlsx(file):
-        df = pd.read_excel(file)
-        return "\n".join(
-            [", ".join([f"{col}: {str(row[col])}" for col in df.columns]) for _, row in df.iterrows()]
-        )
+        return "\n".join(text for text, _ in DocumentHelper.iter_table_chunks(file, "xlsx"))
 
     # ---------------- Dispatcher ----------------
+    # Bump whenever extraction output changes, so cached segments are not reused
+    extractor_version = 4
+    _extraction_cache = None
+
+    @staticmethod
+    def _get_extraction_cache():
+        if DocumentHelper._extraction_cache is None:
+            DocumentHelper._extraction_cache = ExtractionCache()
+        return DocumentHelper._extraction_cache
+
+    @staticmethod
+    def _iter_segments(file, ext):
+        if ext == "pdf":
+            for page_number, text in DocumentHelper.iter_pdf_pages(file):
+                yield text, {"page": page_number}
+            return
+        if ext in DocumentHelper.table_formats:
+            yield from DocumentHelper.iter_table_chunks(file, ext)
+            return
+        if ext in ("ppt", "pptx"):
+            slides = DocumentHelper.convert_legacy(file, "ppt") if ext == "ppt" else file
+            for slide_number, text in DocumentHelper.iter_pptx_slides(slides):
+                yield text, {"slide": slide_number}
+            return
+
+        extractor_map = {
+            "doc": DocumentHelper.extract_doc,
+            "docx": DocumentHelper.extract_docx,
+            "txt": DocumentHelper.extract_txt,
+            "odt": DocumentHelper.extract_odt,
+            "rtf": DocumentHelper.extract_rtf,
+        }
+        yield extractor_map[ext](file), {}
+
+    @staticmethod
+    def _cached_segments(file, ext):
+        """
+        Yields the segments of file from the extraction cache, or extracts them while
+        writing them to it. Time spent producing segments is recorded as the extract stage.
+        """
+        cache = DocumentHelper._get_extraction_cache()
+        key = ExtractionCache.make_key(file.getvalue(), ext, DocumentHelper.extractor_version)
+        segments = cache.get_stream(key)
+        Metrics.increment("extraction_cache_total", result="miss" if segments is None else "hit")
+        if segments is None:
+            segments = cache.put_stream(key, DocumentHelper._iter_segments(file, ext))
+
+        # Segments are consumed as they are produced, so extraction is timed per segment
+        elapsed = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    segment = next(segments)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield segment
+        except Exception:
+            Metrics.increment("errors_total", stage="extract")
+            raise
+        finally:
+            Metrics.observe("stage_seconds", elapsed, stage="extract", format=ext)
+
+    @staticmethod
+    def extract_segments(file):
+        """
+        Extract a document as (text, metadata) segments: pages for pdf, slides for
+        ppt/pptx, row groups for csv/xls/xlsx, a single segment otherwise.
+        Segments are yielded as they are read, so a large pdf or sheet is never
+        held in memory whole. Byte-identical uploads are served from the extraction cache.
+        """
+        ext = file.name.lower().split(".")[-1]
+        if ext not in DocumentHelper.supported_formats:
+            raise ValueError("Unsupported file format.")
+
+        data = file.getvalue() if hasattr(file, "getvalue") else file.read()
+        Metrics.increment("bytes_total", len(data), stage="extract", format=ext)
+        return DocumentHelper._cached_segments(UploadedBytes(file.name, data), ext)
+
     @staticmethod
     def extractText(file):
         """
@@ -146,24 +376,10 @@ class DocumentHelper:
             file_name = file.name.lower()
             ext = file_name.split(".")[-1]
 
-            extractor_map = {
-                "pdf": DocumentHelper.extract_pdf,
-                "doc": DocumentHelper.extract_doc,
-                "docx": DocumentHelper.extract_docx,
-                "txt": DocumentHelper.extract_txt,
-                "ppt": DocumentHelper.extract_ppt,
-                "pptx": DocumentHelper.extract_pptx,
-                "odt": DocumentHelper.extract_odt,
-                "rtf": DocumentHelper.extract_rtf,
-                "csv": DocumentHelper.extract_csv,
-                "xls": DocumentHelper.extract_xls,
-                "xlsx": DocumentHelper.extract_xlsx,
-            }
-
-            if ext not in extractor_map:
+            if ext not in DocumentHelper.supported_formats:
                 return "Unsupported file format."
 
-            return extractor_map[ext](file)
+            return "\n".join(text for text, _ in DocumentHelper.extract_segments(file))
 
         except Exception as e:
             traceback_str = traceback.format_exc()
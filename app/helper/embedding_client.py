@@ -0,0 +1,185 @@
+import os
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from google.api_core.exceptions import ResourceExhausted
+from langchain_core.embeddings import Embeddings
+
+from app.exceptions.gemini import GeminiException
+from app.helper.metrics_helper import Metrics
+
+
+class FakeEmbeddingBackend(Embeddings):
+    """
+    Deterministic offline stand-in for GoogleGenerativeAIEmbeddings.
+    Vectors are derived from the text hash, every request sleeps for
+    latency + per_text_latency * len(texts), and fail_rate of requests
+    raise ResourceExhausted so backoff can be exercised.
+    """
+
+    def __init__(self, dim=768, latency=0.05, per_text_latency=0.0, fail_rate=0.0, seed=0):
+        self.dim = dim
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.fail_rate = fail_rate
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _request(self, count):
+        with self._lock:
+            self.requests += 1
+            failed = self._rng.random() < self.fail_rate
+        time.sleep(self.latency + self.per_text_latency * count)
+        if failed:
+            raise ResourceExhausted("Resource has been exhausted (fake backend)")
+
+    def embed_documents(self, texts, task_type=None, output_dimensionality=None, **kwargs):
+        self._request(len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text, task_type=None, output_dimensionality=None, **kwargs):
+        self._request(1)
+        return self._vector(text)
+
+
+class AsyncEmbeddingClient:
+    """
+    Batched, concurrent embedding client:
+    1. Texts are packed into batches bounded by item count and characters
+    2. Up to `concurrency` batches are in flight at once
+    3. ResourceExhausted / DeadlineExceeded halve the concurrency and retry the
+       batch with exponential backoff; every success raises it by one again
+    """
+
+    def __init__(self, backend, max_batch_texts=None, max_batch_chars=None,
+                 max_concurrency=None, max_retries=None, base_delay=1.0, max_delay=60.0):
+        self.backend = backend
+        self.max_batch_texts = int(max_batch_texts or os.getenv("EMBED_BATCH_SIZE", 100))
+        self.max_batch_chars = int(max_batch_chars or os.getenv("EMBED_BATCH_MAX_CHARS", 60_000))
+        self.max_concurrency = int(max_concurrency or os.getenv("EMBED_MAX_CONCURRENCY", 8))
+        self.max_retries = int(max_retries or os.getenv("EMBED_MAX_RETRIES", 6))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.concurrency = self.max_concurrency
+        self.throttled = 0
+        self.requests = 0
+        self._active = 0
+        self._condition = None
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+
+    # ---------------- Batching ----------------
+    def pack(self, texts):
+        """
+        Returns a list of batches, each a list of indexes into texts
+        """
+        batches, batch, batch_chars = [], [], 0
+        for index, text in enumerate(texts):
+            if batch and (len(batch) >= self.max_batch_texts or batch_chars + len(text) > self.max_batch_chars):
+                batches.append(batch)
+                batch, batch_chars = [], 0
+            batch.append(index)
+            batch_chars += len(text)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    # ---------------- Adaptive Concurrency ----------------
+    def _get_condition(self):
+        # Shared by every call so the limit holds across concurrent ingests
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def _acquire(self, condition):
+        async with condition:
+            await condition.wait_for(lambda: self._active < self.concurrency)
+            self._active += 1
+
+    async def _release(self, condition, throttled):
+        async with condition:
+            self._active -= 1
+            if throttled:
+                self.concurrency = max(1, self.concurrency // 2)
+            else:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+            condition.notify_all()
+
+    def _request(self, texts, kwargs):
+        with Metrics.timer("embedding_request", backend="remote"):
+            vectors = self.backend.embed_documents(texts, **kwargs)
+        Metrics.increment("chunks_total", len(texts), stage="embed")
+        return vectors
+
+    async def _embed_batch(self, condition, texts, kwargs):
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(condition)
+            throttled = False
+            try:
+                self.requests += 1
+                return await loop.run_in_executor(self._executor, self._request, texts, kwargs)
+            except Exception as e:
+                cause = GeminiException.retryable_cause(e)
+                if cause is None or attempt == self.max_retries:
+                    raise
+                throttled = True
+                self.throttled += 1
+                Metrics.increment("embedding_throttled_total")
+                delay = GeminiException.retry_delay(cause) or min(self.max_delay, self.base_delay * 2 ** attempt)
+            finally:
+                await self._release(condition, throttled)
+            # Jitter keeps throttled batches from retrying in lockstep
+            await asyncio.sleep(delay * (0.5 + random.random() / 2))
+
+    async def aembed_documents(self, texts, on_batch=None, **kwargs):
+        """
+        Embed texts in concurrent batches. on_batch(indexes, vectors) is called as each
+        batch completes, so callers can persist partial progress.
+        """
+        condition = self._get_condition()
+        vectors = [None] * len(texts)
+
+        async def run(batch):
+            batch_vectors = await self._embed_batch(condition, [texts[index] for index in batch], kwargs)
+            for index, vector in zip(batch, batch_vectors):
+                vectors[index] = vector
+            if on_batch:
+                on_batch(batch, batch_vectors)
+
+        await asyncio.gather(*(run(batch) for batch in self.pack(texts)))
+        return vectors
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Synchronous LangChain Embeddings facade over AsyncEmbeddingClient.
+    The client runs on one background event loop shared by all callers,
+    so its concurrency limit applies across every ingest in the process.
+    """
+    supports_partial_results = True
+
+    def __init__(self, client):
+        self.client = client
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="embedding-client", daemon=True)
+        self._thread.start()
+
+    def embed_documents(self, texts, on_batch=None, **kwargs):
+        future = asyncio.run_coroutine_threadsafe(
+            self.client.aembed_documents(texts, on_batch=on_batch, **kwargs), self._loop
+        )
+        return future.result()
+
+    def embed_query(self, text, **kwargs):
+        return self.client.backend.embed_query(text, **kwargs)
@@ -0,0 +1,193 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, ClassVar, Dict, List
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.helper.index_factory import IndexFactory
+from app.helper.metrics_helper import Metrics
+
+
+class FederatedRetriever(BaseRetriever):
+    """
+    Searches several saved collections with one query and merges their hits by
+    vector distance, without re-embedding anything into a combined index.
+    1. The query is embedded once and every collection is searched on a shared
+       thread pool (FAISS releases the GIL while it searches)
+    2. Metadata filters ({"source": "policy.pdf"} or {"source": [...], "page": 3}) are
+       resolved to the matching index rows, which FAISS is restricted to through an
+       IDSelector, so scoring only ever sees chunks that pass the filter.
+       Small selections are scored exactly instead, since graph and IVF searches
+       can miss the few allowed rows.
+    3. All collections use the same embeddings (IndexStore refuses others), so their
+       L2 distances are comparable. Hits from IVF-PQ collections, whose codes only
+       approximate distances, are re-scored exactly against the float32 vectors kept
+       beside the codes, before the k closest chunks overall are returned, tagged with
+       the collection they came from
+    Collections are loaded through the IndexStore, so at most max_collections of them
+    (FEDERATED_MAX_COLLECTIONS, INDEX_STORE_MAX_LOADED by default) are searched together.
+    """
+    index_store: Any
+    embeddings: Any
+    collections: List[str]
+    filters: Dict[str, Any] = {}
+    # Each collection contributes at most k candidates, enough for any overall top k
+    k: int = int(os.getenv("RETRIEVER_K", 4))
+    exact_max_rows: int = int(os.getenv("FEDERATED_EXACT_MAX_ROWS", 4096))
+
+    max_collections: ClassVar[int] = int(
+        os.getenv("FEDERATED_MAX_COLLECTIONS", os.getenv("INDEX_STORE_MAX_LOADED", 8))
+    )
+
+    _pool: ClassVar = None
+    _pool_lock: ClassVar = threading.Lock()
+    # (collection, generation, filters) -> matching rows, so a filter is resolved once per index version
+    _row_cache: ClassVar = OrderedDict()
+    _row_cache_size: ClassVar = int(os.getenv("FEDERATED_FILTER_CACHE_SIZE", 128))
+    _row_lock: ClassVar = threading.Lock()
+
+    @staticmethod
+    def _get_pool():
+        with FederatedRetriever._pool_lock:
+            if FederatedRetriever._pool is None:
+                workers = int(os.getenv("FEDERATED_MAX_WORKERS", min(8, os.cpu_count() or 1)))
+                FederatedRetriever._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="federated")
+            return FederatedRetriever._pool
+
+    # ---------------- Filters ----------------
+    @staticmethod
+    def matches(metadata, filters):
+        """
+        True when every filter key is present with the given value, or one of the given values
+        """
+        for key, expected in filters.items():
+            value = metadata.get(key)
+            if isinstance(expected, (list, tuple, set)):
+                if value not in expected:
+                    return False
+            elif value != expected:
+                return False
+        return True
+
+    @staticmethod
+    def _filter_key(filters):
+        return tuple(sorted(
+            (key, tuple(value) if isinstance(value, (list, tuple, set)) else value)
+            for key, value in filters.items()
+        ))
+
+    def _matching_rows(self, name, vectorstore):
+        """
+        Returns the int64 array of index rows whose chunks pass the filters,
+        or None when there are no filters
+        """
+        if not self.filters:
+            return None
+        key = (name, self.index_store.generation(name), id(vectorstore), self._filter_key(self.filters))
+        with self._row_lock:
+            rows = self._row_cache.get(key)
+            if rows is not None:
+                self._row_cache.move_to_end(key)
+                return rows
+
+        docstore = vectorstore.docstore._dict
+        rows = np.fromiter(
+            (
+                row for row, doc_id in vectorstore.index_to_docstore_id.items()
+                if doc_id in docstore and self.matches(docstore[doc_id].metadata, self.filters)
+            ),
+            dtype=np.int64
+        )
+        with self._row_lock:
+            self._row_cache[key] = rows
+            while len(self._row_cache) > self._row_cache_size:
+                self._row_cache.popitem(last=False)
+        return rows
+
+    # ---------------- Search ----------------
+    def _search_collection(self, name, vector):
+        """
+        Returns up to k (distance, document) hits of one collection,
+        documents tagged with the collection name
+        """
+        vectorstore = self.index_store.get(name, self.embeddings)
+        if vectorstore is None:
+            return []
+        # Updates change a loaded collection in place, behind its lock
+        with self.index_store.collection_lock(name).read():
+            return self._search_loaded(name, vectorstore, vector)
+
+    def _search_loaded(self, name, vectorstore, vector):
+        index = vectorstore.index
+        if not index.ntotal:
+            return []
+        rows = self._matching_rows(name, vectorstore)
+        k = min(self.k, index.ntotal)
+
+        if rows is None:
+            distances, found = IndexFactory.search(vectorstore, vector, k)
+            hits = zip(distances[0], found[0])
+        elif not len(rows):
+            return []
+        elif len(rows) <= self.exact_max_rows and IndexFactory.mode_of(index) != "ivfpq":
+            # Exact distances over the few allowed rows
+            candidates = index.reconstruct_batch(rows)
+            distances = ((candidates - vector) ** 2).sum(axis=1)
+            order = np.argsort(distances, kind="stable")[:k]
+            hits = zip(distances[order], rows[order])
+        else:
+            selector = faiss.IDSelectorBatch(rows)
+            distances, found = index.search(
+                vector, min(k, len(rows)), params=IndexFactory.search_params(index, selector, k)
+            )
+            hits = zip(distances[0], found[0])
+
+        hits = [(float(distance), int(row)) for distance, row in hits if row != -1]
+        if hits and IndexFactory.keeps_vectors(index):
+            hits = self._rescore(vectorstore, hits, vector)
+
+        results = []
+        for distance, row in hits:
+            doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id.get(row))
+            if isinstance(doc, Document):
+                results.append((
+                    distance,
+                    Document(page_content=doc.page_content, metadata={**doc.metadata, "collection": name})
+                ))
+        return results
+
+    @staticmethod
+    def _rescore(vectorstore, hits, vector):
+        """
+        Replaces approximate IVF-PQ distances with exact L2 distances to the float32 vectors
+        kept beside the index, so an IVF-PQ collection is not favoured or penalised in the merge
+        """
+        rows = np.fromiter((row for _, row in hits), dtype=np.int64, count=len(hits))
+        with Metrics.timer("rescore", path="federated"):
+            candidates = IndexFactory.stored_vectors(vectorstore, rows)
+            if candidates is None:
+                # Saved before the vectors were kept, the approximate distances are all there is
+                return hits
+            distances = ((candidates - vector) ** 2).sum(axis=1)
+        return list(zip(distances.tolist(), rows.tolist()))
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        with Metrics.timer("retrieve", path="federated"):
+            with Metrics.timer("query_embedding"):
+                vector = np.asarray([self.embeddings.embed_query(query)], dtype=np.float32)
+
+            with Metrics.timer("vector_search", path="federated"):
+                pool = self._get_pool()
+                futures = [pool.submit(self._search_collection, name, vector) for name in self.collections]
+                hits = [hit for future in futures for hit in future.result()]
+            hits.sort(key=lambda hit: hit[0])
+
+            documents = [doc for _, doc in hits[:self.k]]
+            Metrics.increment("retrievals_total", path="federated")
+            Metrics.increment("chunks_total", len(documents), stage="retrieve")
+            return documents
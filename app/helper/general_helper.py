@@ -6,18 +6,16 @@ import streamlit as st
 
 def typewriter_effect(text: str, speed: int):
     try:
-        lines = text.split("\n") 
-        container = st.empty()
-        full_text = ""
+        def stream_words():
+            for line in text.split("\n"):
+                for word in line.split():
+                    yield word + " "
+                    time.sleep(1 / speed)
+                # Add line break for Markdown
+                yield "  \n"
 
-        for line in lines:
-            words = line.split() 
-            for index in range(len(words) + 1):
-                curr_line = " ".join(words[:index])
-                container.markdown(full_text + curr_line)  
-                time.sleep(1 / speed)
-            # Add line break for Markdown
-            full_text += curr_line + "  \n" 
+        # Same rendering path as streamed LLM answers
+        st.write_stream(stream_words())
     except Exception as e:
         # Get the traceback as a string
         traceback_str = traceback.format_exc()
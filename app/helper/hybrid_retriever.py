@@ -0,0 +1,86 @@
+import os
+from contextlib import nullcontext
+from typing import Any
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.helper.index_factory import IndexFactory
+from app.helper.metrics_helper import Metrics
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses BM25 keyword hits with FAISS vector hits by reciprocal-rank fusion.
+    Lexical queries (identifiers, quoted phrases, bare keywords) that the keyword
+    index can answer skip the vector search, and with it the query embedding call.
+    With the collection's ReadWriteLock, index and docstore reads wait out in-place updates.
+    """
+    vectorstore: Any
+    keyword_index: Any
+    lock: Any = None
+    k: int = int(os.getenv("RETRIEVER_K", 4))
+    fetch_k: int = int(os.getenv("RETRIEVER_FETCH_K", 20))
+    rrf_k: int = int(os.getenv("RRF_K", 60))
+    keyword_fast_path: bool = os.getenv("KEYWORD_FAST_PATH", "true").lower() == "true"
+
+    def _reading(self):
+        return self.lock.read() if self.lock is not None else nullcontext()
+
+    def _document(self, doc_id):
+        doc = self.vectorstore.docstore.search(doc_id)
+        return doc if isinstance(doc, Document) else None
+
+    def _vector_search(self, query, k):
+        """
+        Returns up to k docstore ids ranked by vector distance
+        """
+        if not self.vectorstore.index.ntotal:
+            return []
+        with Metrics.timer("query_embedding"):
+            vector = np.asarray([self.vectorstore.embedding_function.embed_query(query)], dtype=np.float32)
+        with Metrics.timer("vector_search"), self._reading():
+            index = self.vectorstore.index
+            if not index.ntotal:
+                return []
+            _, rows = IndexFactory.search(self.vectorstore, vector, min(k, index.ntotal))
+            return [self.vectorstore.index_to_docstore_id[row] for row in rows[0] if row != -1]
+
+    @staticmethod
+    def fuse(rankings, rrf_k=60):
+        """
+        rankings: lists of docstore ids, each best first
+        Returns the ids ordered by their summed 1 / (rrf_k + rank)
+        """
+        scores = {}
+        for ranking in rankings:
+            for rank, doc_id in enumerate(ranking, start=1):
+                scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+        return sorted(scores, key=scores.get, reverse=True)
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        # A reranking stage may ask for more than fetch_k candidates
+        fetch_k = max(self.fetch_k, self.k)
+        with Metrics.timer("retrieve"):
+            with Metrics.timer("keyword_search"), self._reading():
+                keyword_ids = [doc_id for doc_id, _ in self.keyword_index.search(query, fetch_k)]
+
+            if self.keyword_fast_path and keyword_ids and self.keyword_index.is_lexical(query):
+                Metrics.increment("retrievals_total", path="keyword")
+                ranked = keyword_ids
+            else:
+                Metrics.increment("retrievals_total", path="hybrid")
+                ranked = self.fuse([self._vector_search(query, fetch_k), keyword_ids], self.rrf_k)
+
+            # Chunks removed since they were ranked are skipped
+            documents = []
+            with self._reading():
+                for doc_id in ranked:
+                    doc = self._document(doc_id)
+                    if doc is not None:
+                        documents.append(doc)
+                    if len(documents) == self.k:
+                        break
+            Metrics.increment("chunks_total", len(documents), stage="retrieve")
+            return documents
@@ -0,0 +1,341 @@
+import os
+import math
+import time
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores.faiss import FAISS
+
+
+class IndexFactory:
+    """
+    Picks and builds a FAISS index type by corpus size:
+    - flat: exact search, for small corpora
+    - hnsw: graph search, for medium corpora
+    - ivfpq: inverted lists with product quantization, for large corpora
+    Vectors can be stored as float16 (flat/hnsw) to halve their memory.
+    IVF-PQ codes only approximate their vectors, so the float32 vectors are kept
+    beside them (IndexStore maps them from vectors.npy) to score hits exactly.
+    """
+    flat_max_vectors = int(os.getenv("FAISS_FLAT_MAX_VECTORS", 20_000))
+    hnsw_max_vectors = int(os.getenv("FAISS_HNSW_MAX_VECTORS", 500_000))
+    storage = os.getenv("FAISS_STORAGE", "float32")
+    hnsw_m = int(os.getenv("FAISS_HNSW_M", 32))
+    ef_construction = int(os.getenv("FAISS_EF_CONSTRUCTION", 80))
+    ef_search = int(os.getenv("FAISS_EF_SEARCH", 64))
+    nprobe = int(os.getenv("FAISS_NPROBE", 16))
+    pq_bits = 8
+    # IVF-PQ needs enough vectors to train nlist centroids and 2^pq_bits codes per sub-quantizer
+    ivfpq_min_vectors = int(os.getenv("FAISS_IVFPQ_MIN_VECTORS", 39 * 2 ** 8))
+    # Share of removed-but-still-indexed HNSW / IVF rows past which the index is rebuilt
+    tombstone_max_ratio = float(os.getenv("FAISS_TOMBSTONE_MAX_RATIO", 0.2))
+    train_sample_size = int(os.getenv("FAISS_TRAIN_SAMPLE", 100_000))
+    modes = ("flat", "hnsw", "ivfpq")
+
+    # ---------------- Mode Selection ----------------
+    @staticmethod
+    def choose_mode(count):
+        forced = os.getenv("FAISS_INDEX_MODE")
+        # A forced IVF-PQ falls back to the size-based choice until there is enough to train it
+        if forced in IndexFactory.modes and (forced != "ivfpq" or count >= IndexFactory.ivfpq_min_vectors):
+            return forced
+        if count <= IndexFactory.flat_max_vectors:
+            return "flat"
+        if count <= IndexFactory.hnsw_max_vectors:
+            return "hnsw"
+        return "ivfpq"
+
+    @staticmethod
+    def mode_of(index):
+        if isinstance(index, faiss.IndexHNSW):
+            return "hnsw"
+        if isinstance(index, faiss.IndexIVF):
+            return "ivfpq"
+        return "flat"
+
+    @staticmethod
+    def keeps_vectors(index):
+        """
+        True for indexes whose float32 vectors are kept beside them (IVF-PQ)
+        """
+        return isinstance(index, faiss.IndexIVF)
+
+    @staticmethod
+    def _pq_subquantizers(dim):
+        # Largest divisor of dim that keeps at least 8 dimensions per sub-quantizer
+        for m in range(min(64, dim // 8), 0, -1):
+            if dim % m == 0:
+                return m
+        return 1
+
+    # ---------------- Index Creation ----------------
+    @staticmethod
+    def create_index(vectors, mode=None):
+        """
+        vectors: float32 array of shape (n, dim), used to train the index when needed
+        Returns an empty, trained FAISS index
+        """
+        count, dim = vectors.shape
+        mode = mode or IndexFactory.choose_mode(count)
+        if mode == "ivfpq" and count < IndexFactory.ivfpq_min_vectors:
+            print(f"{count} vectors are too few to train IVF-PQ, building a {IndexFactory.choose_mode(count)} index.")
+            mode = IndexFactory.choose_mode(count)
+        half_precision = IndexFactory.storage == "float16"
+
+        if mode == "hnsw":
+            if half_precision:
+                index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_fp16, IndexFactory.hnsw_m)
+            else:
+                index = faiss.IndexHNSWFlat(dim, IndexFactory.hnsw_m)
+            index.hnsw.efConstruction = IndexFactory.ef_construction
+        elif mode == "ivfpq":
+            nlist = max(1, min(int(4 * math.sqrt(count)), count // 39))
+            quantizer = faiss.IndexFlatL2(dim)
+            index = faiss.IndexIVFPQ(
+                quantizer, dim, nlist, IndexFactory._pq_subquantizers(dim), IndexFactory.pq_bits
+            )
+        elif half_precision:
+            index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+        else:
+            index = faiss.IndexFlatL2(dim)
+
+        if not index.is_trained:
+            # Train on a random sample instead of the whole corpus
+            sample_size = min(count, IndexFactory.train_sample_size)
+            sample = vectors[np.random.default_rng(0).choice(count, sample_size, replace=False)]
+            index.train(sample)
+
+        IndexFactory.apply_search_params(index)
+        return index
+
+    @staticmethod
+    def apply_search_params(index):
+        """
+        Set the query-time knobs (nprobe for IVF, efSearch for HNSW) on a built or loaded index
+        """
+        mode = IndexFactory.mode_of(index)
+        if mode == "ivfpq":
+            index.nprobe = IndexFactory.nprobe
+        elif mode == "hnsw":
+            index.hnsw.efSearch = IndexFactory.ef_search
+        return index
+
+    # ---------------- Search ----------------
+    @staticmethod
+    def search_params(index, selector, k):
+        """
+        SearchParameters of the index type restricting a search to selector,
+        keeping the index's own nprobe / efSearch
+        """
+        mode = IndexFactory.mode_of(index)
+        if mode == "hnsw":
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=max(index.hnsw.efSearch, k))
+        if mode == "ivfpq":
+            return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+        return faiss.SearchParameters(sel=selector)
+
+    @staticmethod
+    def deleted_rows(vectorstore):
+        """
+        Index rows whose chunks were removed but are still in the index (HNSW / IVF tombstones),
+        as a sorted int64 array, or None when there are none
+        """
+        index = vectorstore.index
+        docstore = vectorstore.docstore._dict
+        if len(docstore) >= index.ntotal:
+            return None
+        # Rows are only appended and tombstones only added until a rebuild swaps the index,
+        # so these three identify the set
+        version = (id(index), index.ntotal, len(docstore))
+        cached = getattr(vectorstore, "_deleted_rows", None)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        rows = np.fromiter(
+            (row for row, doc_id in vectorstore.index_to_docstore_id.items() if doc_id not in docstore),
+            dtype=np.int64
+        )
+        rows.sort()
+        vectorstore._deleted_rows = (version, rows)
+        return rows
+
+    @staticmethod
+    def search(vectorstore, vectors, k):
+        """
+        index.search that never returns deleted rows
+        """
+        index = vectorstore.index
+        deleted = IndexFactory.deleted_rows(vectorstore)
+        if deleted is None or not len(deleted):
+            return index.search(vectors, k)
+        # The batch selector must outlive the search that uses it through IDSelectorNot
+        deleted_selector = faiss.IDSelectorBatch(deleted)
+        selector = faiss.IDSelectorNot(deleted_selector)
+        return index.search(vectors, k, params=IndexFactory.search_params(index, selector, k))
+
+    # ---------------- Removal ----------------
+    @staticmethod
+    def remove_ids(vectorstore, doc_ids):
+        """
+        Remove chunks from the vectorstore. Flat indexes drop the vectors and renumber
+        their rows. HNSW graphs cannot drop vectors, and IVF lists keep their original
+        labels, which FAISS.delete would renumber away from, so their rows become
+        tombstones: the chunk leaves the docstore, searches skip the row, and the index
+        is only rebuilt once tombstones exceed tombstone_max_ratio of it.
+        """
+        if IndexFactory.mode_of(vectorstore.index) == "flat":
+            vectorstore.delete(list(doc_ids))
+            return vectorstore
+
+        for doc_id in doc_ids:
+            vectorstore.docstore._dict.pop(doc_id, None)
+        index = vectorstore.index
+        if index.ntotal - len(vectorstore.docstore._dict) > IndexFactory.tombstone_max_ratio * index.ntotal:
+            IndexFactory.rebuild(vectorstore)
+        return vectorstore
+
+    # ---------------- Stored Vectors ----------------
+    @staticmethod
+    def keep_vectors(vectorstore, blocks):
+        """
+        Attach the float32 vectors of the index rows, as a list of row blocks,
+        to a vectorstore whose index keeps them; None when they are not available
+        """
+        keep = blocks is not None and IndexFactory.keeps_vectors(vectorstore.index)
+        vectorstore._stored_vectors = list(blocks) if keep else None
+        return vectorstore
+
+    @staticmethod
+    def stored_vectors(vectorstore, rows=None):
+        """
+        float32 vectors of the given index rows (all rows when None) kept beside the index,
+        or None when it keeps none
+        """
+        blocks = getattr(vectorstore, "_stored_vectors", None)
+        # Missing or out of step with the index (e.g. saved before vectors were kept)
+        if blocks is None or sum(len(block) for block in blocks) != vectorstore.index.ntotal:
+            return None
+        if rows is None:
+            if len(blocks) == 1:
+                return blocks[0]
+            return np.concatenate(blocks) if blocks else np.zeros((0, vectorstore.index.d), dtype=np.float32)
+
+        ends = np.cumsum([len(block) for block in blocks])
+
+        rows = np.asarray(rows, dtype=np.int64)
+        which = np.searchsorted(ends, rows, side="right")
+        vectors = np.empty((len(rows), vectorstore.index.d), dtype=np.float32)
+        for block in np.unique(which):
+            selected = which == block
+            vectors[selected] = blocks[block][rows[selected] - (ends[block] - len(blocks[block]))]
+        return vectors
+
+    @staticmethod
+    def add_embeddings(vectorstore, texts, vectors, metadatas, ids=None):
+        """
+        vectorstore.add_embeddings that also keeps the vectors of an index that keeps them.
+        Returns the docstore ids of the added chunks
+        """
+        ids = vectorstore.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+        blocks = getattr(vectorstore, "_stored_vectors", None)
+        if blocks is not None:
+            blocks.append(np.asarray(vectors, dtype=np.float32).reshape(len(ids), vectorstore.index.d))
+        return ids
+
+    # ---------------- Vectorstore ----------------
+    @staticmethod
+    def build_vectorstore(texts, vectors, metadatas, embeddings, mode=None):
+        """
+        Build a FAISS vectorstore from precomputed embeddings using the index type for its size
+        """
+        matrix = np.asarray(vectors, dtype=np.float32)
+        vectorstore = FAISS(
+            embedding_function=embeddings,
+            index=IndexFactory.create_index(matrix, mode),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={}
+        )
+        IndexFactory.keep_vectors(vectorstore, [])
+        IndexFactory.add_embeddings(vectorstore, texts, matrix, metadatas)
+        return vectorstore
+
+    @staticmethod
+    def rebuild(vectorstore, drop_ids=(), mode=None):
+        """
+        Rebuild the index in place from its stored vectors, leaving out drop_ids
+        and tombstoned rows. Used to compact HNSW and IVF tombstones and to move a grown
+        collection to the index type for its new size. Vectors of IVF-PQ indexes come from
+        the ones kept beside them, or are reconstructed from their compressed codes.
+        """
+        drop_ids = set(drop_ids)
+        index = vectorstore.index
+        all_vectors = IndexFactory.stored_vectors(vectorstore)
+        if all_vectors is None:
+            if isinstance(index, faiss.IndexIVF):
+                index.make_direct_map()
+            all_vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, index.d), "float32")
+
+        docstore = vectorstore.docstore._dict
+        kept_rows, kept_ids = [], []
+        for row in range(index.ntotal):
+            doc_id = vectorstore.index_to_docstore_id[row]
+            if doc_id not in drop_ids and doc_id in docstore:
+                kept_rows.append(row)
+                kept_ids.append(doc_id)
+
+        for doc_id in drop_ids:
+            vectorstore.docstore._dict.pop(doc_id, None)
+
+        kept_vectors = np.ascontiguousarray(all_vectors[kept_rows], dtype=np.float32)
+        if len(kept_vectors):
+            new_index = IndexFactory.create_index(kept_vectors, mode or IndexFactory.choose_mode(len(kept_vectors)))
+            new_index.add(kept_vectors)
+        else:
+            new_index = faiss.IndexFlatL2(index.d)
+
+        vectorstore.index = new_index
+        vectorstore.index_to_docstore_id = dict(enumerate(kept_ids))
+        IndexFactory.keep_vectors(vectorstore, [kept_vectors])
+        return vectorstore
+
+    # ---------------- Recall Report ----------------
+    @staticmethod
+    def recall_report(vectors, queries, k=10, modes=None):
+        """
+        Compare each index mode against the exact flat baseline on the same data.
+        Returns a list of dicts with build time, per-query latency, recall@k and size.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+        baseline = faiss.IndexFlatL2(vectors.shape[1])
+        baseline.add(vectors)
+        _, expected = baseline.search(queries, k)
+
+        report = []
+        for mode in modes or IndexFactory.modes:
+            started = time.perf_counter()
+            index = IndexFactory.create_index(vectors, mode)
+            index.add(vectors)
+            build_seconds = time.perf_counter() - started
+
+            latencies = []
+            found = np.empty_like(expected)
+            for row, query in enumerate(queries):
+                started = time.perf_counter()
+                _, ids = index.search(query.reshape(1, -1), k)
+                latencies.append(time.perf_counter() - started)
+                found[row] = ids[0]
+
+            hits = sum(len(set(found[row]) & set(expected[row])) for row in range(len(queries)))
+            report.append({
+                "mode": IndexFactory.mode_of(index),
+                "storage": IndexFactory.storage,
+                "vectors": len(vectors),
+                "build_seconds": round(build_seconds, 3),
+                "latency_ms_p50": round(float(np.percentile(latencies, 50)) * 1000, 3),
+                "latency_ms_p95": round(float(np.percentile(latencies, 95)) * 1000, 3),
+                f"recall_at_{k}": round(hits / (len(queries) * k), 4),
+                "index_bytes": int(faiss.serialize_index(index).nbytes),
+            })
+        return report
@@ -0,0 +1,668 @@
+import os
+import copy
+import json
+import time
+import uuid
+import pickle
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict, Counter
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores.faiss import FAISS
+
+from app.exceptions.index import CollectionConflictError, CollectionInUseError, EmbeddingMismatchError
+from app.helper.index_factory import IndexFactory
+from app.helper.keyword_index import KeywordIndex
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class ReadWriteLock:
+    """
+    Many readers or one writer. New readers wait while a writer is waiting,
+    so a steady stream of queries cannot hold off an update. Not reentrant.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writing or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class CollectionDelta:
+    """
+    Removals and additions applied in place to a loaded collection, recorded as
+    operations so that only they are written, and replayed on load
+    """
+
+    def __init__(self, vectorstore, keyword_index):
+        self.vectorstore = vectorstore
+        self.keyword_index = keyword_index
+        self.operations = []
+        self.docstore_bytes = 0
+
+    def remove(self, doc_ids):
+        docstore = self.vectorstore.docstore._dict
+        doc_ids = [doc_id for doc_id in doc_ids if doc_id in docstore]
+        if not doc_ids:
+            return
+        self.docstore_bytes -= sum(len(docstore[doc_id].page_content.encode("utf-8")) for doc_id in doc_ids)
+        IndexFactory.remove_ids(self.vectorstore, doc_ids)
+        self.keyword_index.remove(doc_ids)
+        self.operations.append(("remove", doc_ids))
+
+    def add(self, texts, vectors, metadatas, ids=None):
+        """
+        Returns the docstore ids of the added chunks
+        """
+        ids = IndexFactory.add_embeddings(self.vectorstore, texts, vectors, metadatas, ids=ids)
+        self.keyword_index.add_documents(zip(ids, texts))
+        self.docstore_bytes += sum(len(text.encode("utf-8")) for text in texts)
+        self.operations.append(
+            ("add", list(ids), list(texts), np.asarray(vectors, dtype=np.float32), list(metadatas))
+        )
+        return ids
+
+    def replay(self, operations):
+        for operation in operations:
+            if operation[0] == "remove":
+                self.remove(operation[1])
+            else:
+                _, ids, texts, vectors, metadatas = operation
+                self.add(texts, vectors, metadatas, ids=ids)
+
+
+class IndexStore:
+    """
+    Named-collection store for FAISS indexes.
+    Each collection is saved to <root>/<name>/ as:
+    - index.faiss: the raw FAISS index
+    - index.pkl: the docstore and index -> docstore id mapping
+    - keywords.pkl: the BM25 keyword index over the same chunks
+    - vectors.npy: the float32 vectors of IVF-PQ collections, memory-mapped on load
+    - meta.json: embedding model, dimension, sources, owners and generation
+    - deltas/<generation>.pkl: chunks removed and added by updates since the files above
+      were written, replayed on load
+    A collection is only ever loaded with the embedding model and dimension it was built with.
+    Collections are loaded on demand and the most recently used ones are kept in RAM;
+    a loaded collection is reloaded once another process saves a newer generation of it.
+    Pinned collections (in use by a live session) are never evicted from RAM, and
+    every process holds a shared lock on the .<name>.use file of the ones it pins,
+    so a collection in use by any process sharing the root is never deleted.
+    Saves of one collection are serialized across processes sharing the root by a
+    lock file, and a save based on an outdated generation is refused.
+    Updates change the loaded collection in place behind its read/write lock, which
+    searches take, and only write their delta; after max_deltas of them the whole
+    collection is rewritten and the deltas dropped.
+    """
+
+    def __init__(self, root=None, max_loaded=None):
+        self.root = root or os.getenv("INDEX_STORE_DIR", ".index_store")
+        self.max_loaded = int(max_loaded or os.getenv("INDEX_STORE_MAX_LOADED", 8))
+        self.max_deltas = int(os.getenv("INDEX_STORE_MAX_DELTAS", 32))
+        self._loaded = OrderedDict()
+        self._keyword_indexes = {}
+        self._generations = {}
+        # Docstore text bytes of each loaded collection, measured when it is saved
+        self._docstore_bytes = {}
+        self._pins = Counter()
+        self._use_files = {}
+        self._mapped = set()
+        self._collection_locks = {}
+        self._held_file_locks = threading.local()
+        self._lock = threading.RLock()
+        os.makedirs(self.root, exist_ok=True)
+
+    # ---------------- Naming ----------------
+    @staticmethod
+    def collection_name_for(uploaded_docs):
+        """
+        Derive a stable collection name from the names and bytes of the uploads,
+        so re-uploading the same document set reuses the saved index
+        """
+        digests = []
+        for file in uploaded_docs:
+            data = file.getvalue() if hasattr(file, "getvalue") else file.read()
+            digests.append(file.name + ":" + hashlib.sha256(data).hexdigest())
+        combined = hashlib.sha256("\n".join(sorted(digests)).encode("utf-8")).hexdigest()
+        return f"docs-{combined[:16]}"
+
+    def _path(self, name):
+        if not name or os.sep in name or name.startswith("."):
+            raise ValueError(f"Invalid collection name: {name!r}")
+        return os.path.join(self.root, name)
+
+    @contextmanager
+    def _file_lock(self, name):
+        """
+        Exclusive lock on a collection across the processes sharing the store,
+        reentrant within a thread. Without fcntl (Windows) only the threads of
+        this process are serialized.
+        """
+        held = self._held_file_locks.__dict__.setdefault("names", set())
+        if fcntl is None or name in held:
+            yield
+            return
+        with open(os.path.join(self.root, f".{name}.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            held.add(name)
+            try:
+                yield
+            finally:
+                held.discard(name)
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def collection_lock(self, name):
+        """
+        ReadWriteLock of a collection: searches read, in-place updates write
+        """
+        with self._lock:
+            return self._collection_locks.setdefault(name, ReadWriteLock())
+
+    # ---------------- Queries ----------------
+    def exists(self, name):
+        return os.path.isfile(os.path.join(self._path(name), "meta.json"))
+
+    def get_meta(self, name):
+        try:
+            with open(os.path.join(self._path(name), "meta.json"), "r", encoding="utf-8") as meta_file:
+                return json.load(meta_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def generation(self, name):
+        meta = self.get_meta(name)
+        return meta.get("generation", 0) if meta else None
+
+    @staticmethod
+    def embedding_tag(embeddings):
+        """
+        (model name, dimension) of an embeddings object, None where it does not say
+        """
+        return getattr(embeddings, "model_name", None), getattr(embeddings, "output_dim", None)
+
+    def matches_embeddings(self, name, embeddings):
+        """
+        False when the saved collection was tagged with a different embedding model or dimension
+        """
+        meta = self.get_meta(name) or {}
+        model_name, dim = self.embedding_tag(embeddings)
+        if model_name and meta.get("model") and meta["model"] != model_name:
+            return False
+        return not (dim and meta.get("dim") and meta["dim"] != dim)
+
+    def _check_embeddings(self, name, embeddings):
+        if not self.matches_embeddings(name, embeddings):
+            meta = self.get_meta(name) or {}
+            raise EmbeddingMismatchError(name, (meta.get("model"), meta.get("dim")), self.embedding_tag(embeddings))
+
+    def list_collections(self, owner=None):
+        """
+        Returns (name, meta) of the saved collections, only those the owner
+        created or opened when an owner is given
+        """
+        collections = []
+        for name in sorted(os.listdir(self.root)):
+            if name.startswith("."):
+                continue
+            meta = self.get_meta(name)
+            if meta is not None and (owner is None or owner in meta.get("owners", [])):
+                collections.append((name, meta))
+        return collections
+
+    def add_owner(self, name, owner):
+        """
+        Record that owner may list and reopen the collection. Only meta.json is
+        rewritten, the generation is unchanged, so loaded copies stay valid.
+        """
+        with self._file_lock(name), self._lock:
+            meta = self.get_meta(name)
+            if meta is None or owner in meta.get("owners", []):
+                return
+            meta["owners"] = meta.get("owners", []) + [owner]
+            self._write_meta(name, meta)
+
+    def _write_meta(self, name, meta):
+        meta_path = os.path.join(self._path(name), "meta.json")
+        scratch = f"{meta_path}.tmp-{uuid.uuid4().hex}"
+        with open(scratch, "w", encoding="utf-8") as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(scratch, meta_path)
+
+    # ---------------- Save ----------------
+    def save(self, name, vectorstore, meta=None, keyword_index=None, expected_generation=None):
+        """
+        Write the collection to a scratch directory and swap it in,
+        so readers never see a half-written index.
+        The keyword index is built from the docstore when not given.
+        expected_generation: generation the change was based on; when the saved collection
+        has moved past it, CollectionConflictError is raised and nothing is written
+        """
+        path = self._path(name)
+        if keyword_index is None:
+            keyword_index = KeywordIndex.from_vectorstore(vectorstore)
+        with self._file_lock(name), self._lock:
+            previous = self.get_meta(name) or {}
+            current_generation = previous.get("generation", 0)
+            if expected_generation is not None and current_generation != expected_generation:
+                raise CollectionConflictError(name, expected_generation, current_generation)
+            meta = dict(meta or {})
+            model_name, _ = self.embedding_tag(vectorstore.embedding_function)
+            if model_name:
+                meta["model"] = model_name
+            # Rebuilding a collection keeps who may open it
+            meta.setdefault("owners", previous.get("owners", []))
+            # The scratch directory has no deltas, everything is in the files written below
+            meta.pop("deltas", None)
+            meta.update({
+                "docstore_bytes": self._measure_docstore(vectorstore),
+                "count": vectorstore.index.ntotal,
+                "dim": vectorstore.index.d,
+                "index_mode": IndexFactory.mode_of(vectorstore.index),
+                "generation": current_generation + 1,
+                "updated_at": time.time(),
+            })
+
+            scratch = os.path.join(self.root, f".{name}.tmp-{uuid.uuid4().hex}")
+            os.makedirs(scratch)
+            faiss.write_index(vectorstore.index, os.path.join(scratch, "index.faiss"))
+            with open(os.path.join(scratch, "index.pkl"), "wb") as pkl_file:
+                pickle.dump((vectorstore.docstore, vectorstore.index_to_docstore_id), pkl_file)
+            with open(os.path.join(scratch, "keywords.pkl"), "wb") as pkl_file:
+                pickle.dump(keyword_index, pkl_file, protocol=pickle.HIGHEST_PROTOCOL)
+            stored_vectors = IndexFactory.stored_vectors(vectorstore)
+            if stored_vectors is not None:
+                np.save(os.path.join(scratch, "vectors.npy"), stored_vectors)
+            with open(os.path.join(scratch, "meta.json"), "w", encoding="utf-8") as meta_file:
+                json.dump(meta, meta_file)
+
+            stale = None
+            if os.path.exists(path):
+                stale = os.path.join(self.root, f".{name}.old-{uuid.uuid4().hex}")
+                os.rename(path, stale)
+            os.rename(scratch, path)
+            if stale:
+                shutil.rmtree(stale, ignore_errors=True)
+            if stored_vectors is not None:
+                # Served from the page cache from now on instead of RAM
+                IndexFactory.keep_vectors(vectorstore, [self._read_vectors(name)])
+
+            self._mapped.discard(name)
+            self._generations[name] = meta["generation"]
+            self._docstore_bytes[name] = meta["docstore_bytes"]
+            self._remember(name, vectorstore)
+            self._keyword_indexes[name] = keyword_index
+            return meta
+
+    # ---------------- Update ----------------
+    def update(self, name, embeddings, change):
+        """
+        Apply change(delta, meta) to the loaded collection in place: delta is a
+        CollectionDelta over it, meta its meta.json dict to edit. Searches wait on
+        the collection lock meanwhile, so they never see a half-applied change.
+        Only the delta is written, unless the change rebuilt the index or the
+        collection has max_deltas of them, in which case the whole of it is saved.
+        Returns the vectorstore, or None when the collection does not exist
+        """
+        with self._file_lock(name):
+            # Under the file lock, get() reloads a generation saved by another process,
+            # so the change always lands on the latest version
+            vectorstore = self.get(name, embeddings)
+            if vectorstore is None:
+                return None
+            keyword_index = self.get_keyword_index(name, embeddings)
+            meta = self.get_meta(name) or {}
+            generation = meta.get("generation", 0)
+
+            with self.collection_lock(name).write():
+                try:
+                    if name in self._mapped:
+                        # A read-only memory-mapped index is read into RAM by its first update
+                        vectorstore.index = IndexFactory.apply_search_params(self._copy_index(name, vectorstore.index))
+                        self._mapped.discard(name)
+                    index = vectorstore.index
+                    delta = CollectionDelta(vectorstore, keyword_index)
+                    change(delta, meta)
+                    if vectorstore.index is not index or meta.get("deltas", 0) >= self.max_deltas:
+                        self.save(name, vectorstore, meta=meta, keyword_index=keyword_index,
+                                  expected_generation=generation)
+                    elif delta.operations:
+                        self._save_delta(name, vectorstore, delta, meta)
+                except Exception:
+                    # The saved version is reloaded rather than serving a half-applied change
+                    self.evict(name)
+                    raise
+            return vectorstore
+
+    def _save_delta(self, name, vectorstore, delta, meta):
+        generation = meta.get("generation", 0) + 1
+        delta_dir = os.path.join(self._path(name), "deltas")
+        os.makedirs(delta_dir, exist_ok=True)
+        delta_path = os.path.join(delta_dir, f"{generation:08d}.pkl")
+        scratch = f"{delta_path}.tmp-{uuid.uuid4().hex}"
+        with open(scratch, "wb") as pkl_file:
+            pickle.dump(delta.operations, pkl_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(scratch, delta_path)
+
+        if "docstore_bytes" in meta:
+            docstore_bytes = meta["docstore_bytes"] + delta.docstore_bytes
+        else:
+            docstore_bytes = self._measure_docstore(vectorstore)
+        meta.update({
+            "docstore_bytes": docstore_bytes,
+            "count": vectorstore.index.ntotal,
+            "index_mode": IndexFactory.mode_of(vectorstore.index),
+            "generation": generation,
+            "deltas": meta.get("deltas", 0) + 1,
+            "updated_at": time.time(),
+        })
+        # meta.json is written last: until then other processes load the previous generation
+        self._write_meta(name, meta)
+        with self._lock:
+            self._generations[name] = generation
+            self._docstore_bytes[name] = docstore_bytes
+
+    def _replay_deltas(self, name, vectorstore, keyword_index, generation):
+        """
+        Apply the saved deltas up to generation; later ones belong to an update that never
+        committed its meta.json
+        """
+        delta_dir = os.path.join(self._path(name), "deltas")
+        delta = CollectionDelta(vectorstore, keyword_index)
+        for file_name in sorted(os.listdir(delta_dir)):
+            if not file_name.endswith(".pkl") or int(file_name[:-len(".pkl")]) > generation:
+                continue
+            with open(os.path.join(delta_dir, file_name), "rb") as pkl_file:
+                delta.replay(pickle.load(pkl_file))
+
+    # ---------------- Load ----------------
+    @staticmethod
+    def _read_index(index_path, mmap=True):
+        """
+        Memory-map the index where the index type supports it, else read it into RAM.
+        Returns (index, mapped)
+        """
+        if mmap:
+            try:
+                return faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY), True
+            except RuntimeError:
+                pass
+        return faiss.read_index(index_path), False
+
+    def _read_vectors(self, name):
+        vectors_path = os.path.join(self._path(name), "vectors.npy")
+        return np.load(vectors_path, mmap_mode="r") if os.path.exists(vectors_path) else None
+
+    def _read_keyword_index(self, name, vectorstore):
+        try:
+            with open(os.path.join(self._path(name), "keywords.pkl"), "rb") as pkl_file:
+                return pickle.load(pkl_file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return KeywordIndex.from_vectorstore(vectorstore)
+
+    def get(self, name, embeddings):
+        """
+        Return the collection's FAISS vectorstore, loading it from disk if it is not hot
+        """
+        if not name:
+            return None
+        with self._lock:
+            if name in self._loaded:
+                # Another worker process may have saved a newer generation since it was loaded
+                if self._generations.get(name) == self.generation(name):
+                    self._loaded.move_to_end(name)
+                    return self._loaded[name]
+                self._loaded.pop(name)
+                self._keyword_indexes.pop(name, None)
+
+            path = self._path(name)
+            if not self.exists(name):
+                return None
+            self._check_embeddings(name, embeddings)
+            # Read before the files: a save swapping them in meanwhile leaves this generation
+            # behind, so the copy is reloaded and no change is saved on top of it
+            meta = self.get_meta(name) or {}
+
+            # Deltas are replayed into the index, so it cannot be a read-only mapping
+            index, mapped = self._read_index(os.path.join(path, "index.faiss"), mmap=not meta.get("deltas"))
+            IndexFactory.apply_search_params(index)
+            if mapped:
+                self._mapped.add(name)
+            else:
+                self._mapped.discard(name)
+            with open(os.path.join(path, "index.pkl"), "rb") as pkl_file:
+                docstore, index_to_docstore_id = pickle.load(pkl_file)
+
+            vectorstore = FAISS(
+                embedding_function=embeddings,
+                index=index,
+                docstore=docstore,
+                index_to_docstore_id=index_to_docstore_id
+            )
+            vectors = self._read_vectors(name)
+            IndexFactory.keep_vectors(vectorstore, None if vectors is None else [vectors])
+            if meta.get("deltas"):
+                keyword_index = self._read_keyword_index(name, vectorstore)
+                self._replay_deltas(name, vectorstore, keyword_index, meta.get("generation", 0))
+                self._keyword_indexes[name] = keyword_index
+            self._generations[name] = meta.get("generation", 0)
+            if "docstore_bytes" in meta:
+                self._docstore_bytes[name] = meta["docstore_bytes"]
+            else:
+                # Saved before the size was recorded
+                self._docstore_bytes[name] = self._measure_docstore(vectorstore)
+            self._remember(name, vectorstore)
+            return vectorstore
+
+    def get_keyword_index(self, name, embeddings):
+        """
+        Return the collection's keyword index, loading it with the collection.
+        Collections saved before keyword indexes existed get one built from their docstore.
+        """
+        with self._lock:
+            vectorstore = self.get(name, embeddings)
+            if vectorstore is None:
+                return None
+            if name in self._keyword_indexes:
+                return self._keyword_indexes[name]
+
+            keyword_index = self._read_keyword_index(name, vectorstore)
+            self._keyword_indexes[name] = keyword_index
+            return keyword_index
+
+    def clone(self, name, embeddings):
+        """
+        Independent copy of a collection: (vectorstore, keyword_index, generation),
+        all None when the collection does not exist.
+        A memory-mapped index is read into RAM by the copy.
+        """
+        with self._lock:
+            vectorstore = self.get(name, embeddings)
+            if vectorstore is None:
+                return None, None, None
+            keyword_index = self.get_keyword_index(name, embeddings)
+            generation = self._generations.get(name)
+        # Taken outside the store lock: an update may be waiting on the store lock while holding it
+        with self.collection_lock(name).read():
+            copied = FAISS(
+                embedding_function=embeddings,
+                index=self._copy_index(name, vectorstore.index),
+                docstore=InMemoryDocstore(dict(vectorstore.docstore._dict)),
+                index_to_docstore_id=dict(vectorstore.index_to_docstore_id)
+            )
+            IndexFactory.keep_vectors(copied, getattr(vectorstore, "_stored_vectors", None))
+        IndexFactory.apply_search_params(copied.index)
+        return copied, copy.deepcopy(keyword_index), generation
+
+    def _copy_index(self, name, index):
+        """
+        In-RAM copy of a loaded index. clone_index cannot copy the on-disk inverted lists
+        of a memory-mapped IVF index, so that one is read again from its file, which only
+        a save of a newer generation replaces
+        """
+        if name not in self._mapped or not isinstance(index, faiss.IndexIVF):
+            return faiss.clone_index(index)
+        generation = self._generations.get(name)
+        copied, _ = self._read_index(os.path.join(self._path(name), "index.faiss"), mmap=False)
+        current_generation = self.generation(name)
+        if current_generation != generation:
+            raise CollectionConflictError(name, generation, current_generation)
+        return copied
+
+    def fork(self, name, new_name, embeddings):
+        """
+        Copy a collection under a new name, so it can be changed without
+        affecting the sessions still using the original
+        """
+        with self._lock:
+            forked, keyword_index, _ = self.clone(name, embeddings)
+            if forked is None:
+                return None
+            meta = self.get_meta(name) or {}
+            meta["forked_from"] = name
+            # A fork belongs to whoever changes it, not to every owner of the original
+            meta.pop("owners", None)
+            self.save(new_name, forked, meta=meta, keyword_index=keyword_index)
+            return forked
+
+    def _remember(self, name, vectorstore):
+        self._loaded[name] = vectorstore
+        self._loaded.move_to_end(name)
+        overflow = len(self._loaded) - self.max_loaded
+        for loaded_name in list(self._loaded):
+            if overflow <= 0:
+                break
+            if self._pins[loaded_name] > 0:
+                continue
+            del self._loaded[loaded_name]
+            self._keyword_indexes.pop(loaded_name, None)
+            self._docstore_bytes.pop(loaded_name, None)
+            overflow -= 1
+
+    # ---------------- Pinning ----------------
+    def pin(self, name):
+        with self._lock:
+            self._pins[name] += 1
+            if fcntl is not None and name not in self._use_files:
+                use_file = open(os.path.join(self.root, f".{name}.use"), "a")
+                fcntl.flock(use_file, fcntl.LOCK_SH)
+                self._use_files[name] = use_file
+
+    def unpin(self, name):
+        with self._lock:
+            self._pins[name] -= 1
+            if self._pins[name] <= 0:
+                del self._pins[name]
+                use_file = self._use_files.pop(name, None)
+                if use_file is not None:
+                    fcntl.flock(use_file, fcntl.LOCK_UN)
+                    use_file.close()
+
+    @contextmanager
+    def _unused(self, name):
+        """
+        Holds off new pins of a collection for the block, raising CollectionInUseError
+        when a process sharing the store (this one included) has it pinned
+        """
+        if fcntl is None:
+            if self._pins[name] > 0:
+                raise CollectionInUseError(name)
+            yield
+            return
+        with open(os.path.join(self.root, f".{name}.use"), "a") as use_file:
+            try:
+                fcntl.flock(use_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise CollectionInUseError(name)
+            try:
+                yield
+            finally:
+                fcntl.flock(use_file, fcntl.LOCK_UN)
+
+    # ---------------- Memory ----------------
+    @staticmethod
+    def _measure_docstore(vectorstore):
+        return sum(len(doc.page_content.encode("utf-8")) for doc in vectorstore.docstore._dict.values())
+
+    def memory_usage(self, name):
+        """
+        Approximate resident bytes of a loaded collection: vector codes plus docstore text.
+        The docstore size is the one measured when the collection was saved or loaded.
+        """
+        with self._lock:
+            vectorstore = self._loaded.get(name)
+            if vectorstore is None:
+                return {"index_bytes": 0, "docstore_bytes": 0, "total_bytes": 0}
+            index = vectorstore.index
+            docstore_bytes = self._docstore_bytes.get(name, 0)
+
+        try:
+            index_bytes = index.ntotal * index.sa_code_size()
+        except RuntimeError:
+            index_bytes = index.ntotal * index.d * 4
+        return {
+            "index_bytes": index_bytes,
+            "docstore_bytes": docstore_bytes,
+            "total_bytes": index_bytes + docstore_bytes,
+        }
+
+    # ---------------- Delete ----------------
+    def evict(self, name):
+        with self._lock:
+            self._loaded.pop(name, None)
+            self._keyword_indexes.pop(name, None)
+            self._docstore_bytes.pop(name, None)
+
+    def delete(self, name):
+        """
+        Delete a collection no process has pinned; raises CollectionInUseError otherwise.
+        Holds the collection's file lock, so it never interleaves with a save or update.
+        """
+        path = self._path(name)
+        with self._file_lock(name), self._lock, self._unused(name):
+            self._loaded.pop(name, None)
+            self._keyword_indexes.pop(name, None)
+            self._docstore_bytes.pop(name, None)
+            self._mapped.discard(name)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+                return True
+            return False
@@ -0,0 +1,161 @@
+import os
+import time
+import traceback
+import multiprocessing
+from concurrent.futures import (
+    ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+)
+from concurrent.futures.process import BrokenProcessPool
+
+from app.helper.document_helper import DocumentHelper, UploadedBytes
+from app.helper.chunk_helper import ChunkHelper
+from app.helper.metrics_helper import Metrics
+
+
+def _timed(iterable, elapsed):
+    """
+    Yields from iterable, adding the time spent producing each item to elapsed[0]
+    """
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            elapsed[0] += time.perf_counter() - started
+        yield item
+
+
+def _extract_and_split(file_name, data):
+    """
+    Runs inside a worker process: stream the segments of one upload (pages,
+    slides or row groups, from the extraction cache when it was seen before)
+    straight into the chunking strategy of its format.
+    Returns (chunks, metrics): a list of (chunk_text, metadata) tuples and the
+    worker's metrics for this file, to be merged into the parent process.
+    """
+    ext = file_name.lower().split(".")[-1]
+    try:
+        # Extraction records its own time per segment; chunking is the remainder
+        extract_seconds = [0.0]
+        started = time.perf_counter()
+        segments = _timed(DocumentHelper.extract_segments(UploadedBytes(file_name, data)), extract_seconds)
+        chunks = list(ChunkHelper.split(segments, file_name, ext))
+        Metrics.observe(
+            "stage_seconds", time.perf_counter() - started - extract_seconds[0], stage="chunk", format=ext
+        )
+    except Exception as e:
+        traceback_str = traceback.format_exc()
+        print(traceback_str)
+        line_no = traceback.extract_tb(e.__traceback__)[-1][1]
+        print(f"Exception occurred on line {line_no}")
+        return [], Metrics.drain()
+
+    Metrics.increment("chunks_total", len(chunks), stage="chunk")
+    Metrics.increment("tokens_total", sum(metadata.get("token_count", 0) for _, metadata in chunks), kind="chunk")
+    # A worker runs one task at a time, so what it drains covers exactly this file
+    return chunks, Metrics.drain()
+
+
+class IngestPipeline:
+    """
+    Pipelined ingest:
+    1. Extraction + chunking of every file runs in a process pool; legacy doc/ppt/xls
+       files go to a smaller pool so slow Spire conversions run with bounded concurrency.
+       Both pools spawn fresh interpreters: a fork of this threaded process could copy a
+       lock (metrics, SQLite cache, ...) held by another thread and deadlock, and Spire's
+       native runtime hangs in workers forked from a process that has already loaded it.
+    2. Chunks stream out as each file finishes and are packed into batches
+    3. Batches are embedded concurrently with a bounded number in flight
+    """
+    _process_pools = {}
+
+    def __init__(self, embeddings, max_workers=None, batch_size=None, max_in_flight=None):
+        self.embeddings = embeddings
+        self.max_workers = max_workers or int(os.getenv("INGEST_MAX_WORKERS", os.cpu_count() or 1))
+        self.conversion_workers = int(os.getenv("LEGACY_CONVERSION_WORKERS", 2))
+        self.batch_size = batch_size or int(os.getenv("EMBED_BATCH_SIZE", 100))
+        self.max_in_flight = max_in_flight or int(os.getenv("EMBED_MAX_IN_FLIGHT", 4))
+
+    # ---------------- Process Pool ----------------
+    @classmethod
+    def _get_process_pool(cls, name, max_workers, start_method=None):
+        # Pools are shared across uploads so workers are only spawned once
+        if name not in cls._process_pools:
+            mp_context = multiprocessing.get_context(start_method) if start_method else None
+            cls._process_pools[name] = ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context)
+        return cls._process_pools[name]
+
+    @classmethod
+    def _reset_process_pools(cls):
+        for pool in cls._process_pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        cls._process_pools = {}
+
+    def _pool_for(self, file_name):
+        if file_name.lower().split(".")[-1] in DocumentHelper.legacy_formats:
+            return self._get_process_pool("conversion", self.conversion_workers, start_method="spawn")
+        return self._get_process_pool("extraction", self.max_workers, start_method="spawn")
+
+    @staticmethod
+    def _read_upload(file):
+        if hasattr(file, "getvalue"):
+            return file.getvalue()
+        file.seek(0)
+        return file.read()
+
+    # ---------------- Run ----------------
+    def run(self, uploaded_docs):
+        """
+        uploaded_docs: list of files uploaded by user
+        Returns (texts, embeddings, metadatas) in matching order
+        """
+        extract_futures = [
+            self._pool_for(file.name).submit(_extract_and_split, file.name, self._read_upload(file))
+            for file in uploaded_docs
+        ]
+
+        batches = []
+        results = {}
+        in_flight = {}
+        pending = []
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as embed_pool:
+            def submit_batch(batch):
+                # Apply backpressure once the in-flight limit is reached
+                while len(in_flight) >= self.max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results[in_flight.pop(future)] = future.result()
+                batch_index = len(batches)
+                batches.append(batch)
+                future = embed_pool.submit(self.embeddings.embed_documents, [text for text, _ in batch])
+                in_flight[future] = batch_index
+
+            try:
+                for future in as_completed(extract_futures):
+                    chunks, worker_metrics = future.result()
+                    Metrics.merge(worker_metrics)
+                    pending.extend(chunks)
+                    while len(pending) >= self.batch_size:
+                        submit_batch(pending[:self.batch_size])
+                        pending = pending[self.batch_size:]
+            except BrokenProcessPool:
+                self._reset_process_pools()
+                raise
+
+            if pending:
+                submit_batch(pending)
+
+            for future in as_completed(list(in_flight)):
+                results[in_flight.pop(future)] = future.result()
+
+        texts, vectors, metadatas = [], [], []
+        for batch_index, batch in enumerate(batches):
+            for (text, metadata), vector in zip(batch, results[batch_index]):
+                texts.append(text)
+                vectors.append(vector)
+                metadatas.append(metadata)
+        return texts, vectors, metadatas
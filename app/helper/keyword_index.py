@@ -0,0 +1,132 @@
+import re
+import math
+from collections import Counter, defaultdict
+
+
+class KeywordIndex:
+    """
+    In-process BM25 inverted index over the chunks of a collection.
+    Postings map each term to {docstore id: term frequency}, so chunks can be
+    added and removed by the same ids the FAISS docstore uses.
+    """
+    k1 = 1.5
+    b = 0.75
+
+    _token_pattern = re.compile(r"[a-z0-9]+(?:[._/-][a-z0-9]+)*")
+    # Part numbers, clause ids, versions: tokens mixing digits with letters or separators
+    _identifier_pattern = re.compile(r"^(?=.*\d)[a-z0-9]+(?:[._/-][a-z0-9]+)*$|^[a-z0-9]+(?:[._/-][a-z0-9]+)+$")
+    _stopwords = frozenset("""
+        a an and are as at be by for from has have how in is it its of on or that the this
+        to was were what when where which who why will with does do did can about
+    """.split())
+    lexical_max_terms = 3
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.doc_terms = {}
+        self.doc_lengths = {}
+        self.total_length = 0
+
+    # ---------------- Tokenizing ----------------
+    @staticmethod
+    def tokenize(text):
+        """
+        Lowercased word tokens; identifiers such as "AB-1234" or "4.2.1" are kept whole
+        and also split into their parts, so either form of a query matches
+        """
+        tokens = []
+        for token in KeywordIndex._token_pattern.findall(text.lower()):
+            tokens.append(token)
+            parts = re.split(r"[._/-]", token)
+            if len(parts) > 1:
+                tokens.extend(parts)
+        return tokens
+
+    @staticmethod
+    def _query_terms(query):
+        return [token for token in KeywordIndex.tokenize(query) if token not in KeywordIndex._stopwords]
+
+    @staticmethod
+    def is_lexical(query):
+        """
+        True for queries that are better answered by exact terms than by meaning:
+        quoted phrases, identifiers, or a handful of bare keywords
+        """
+        if '"' in query:
+            return True
+        words = [
+            word for word in KeywordIndex._token_pattern.findall(query.lower())
+            if word not in KeywordIndex._stopwords
+        ]
+        if not words:
+            return False
+        if any(KeywordIndex._identifier_pattern.match(word) for word in words):
+            return True
+        return len(words) <= KeywordIndex.lexical_max_terms and not query.rstrip().endswith("?")
+
+    # ---------------- Updates ----------------
+    def add(self, doc_id, text):
+        if doc_id in self.doc_terms:
+            self.remove([doc_id])
+        counts = Counter(self.tokenize(text))
+        for term, count in counts.items():
+            self.postings[term][doc_id] = count
+        self.doc_terms[doc_id] = tuple(counts)
+        length = sum(counts.values())
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+
+    def add_documents(self, items):
+        """
+        items: iterable of (docstore id, text)
+        """
+        for doc_id, text in items:
+            self.add(doc_id, text)
+        return self
+
+    def remove(self, doc_ids):
+        for doc_id in doc_ids:
+            terms = self.doc_terms.pop(doc_id, None)
+            if terms is None:
+                continue
+            for term in terms:
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self.postings[term]
+            self.total_length -= self.doc_lengths.pop(doc_id)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore):
+        """
+        Build the index from the chunks of a FAISS vectorstore's docstore
+        """
+        return cls().add_documents(
+            (doc_id, doc.page_content) for doc_id, doc in vectorstore.docstore._dict.items()
+        )
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    # ---------------- Search ----------------
+    def search(self, query, k=4):
+        """
+        Returns up to k (docstore id, BM25 score) pairs, best first
+        """
+        count = len(self.doc_lengths)
+        if not count:
+            return []
+        average_length = self.total_length / count
+
+        scores = defaultdict(float)
+        for term in set(self._query_terms(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
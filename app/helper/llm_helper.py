@@ -1,31 +1,58 @@
 import os
+import time
+import threading
 import traceback
 
 from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_google_genai import chat_models
 from langchain_google_genai.chat_models import ChatGoogleGenerativeAI, ChatGoogleGenerativeAIError
 from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
 from google.api_core.exceptions import ResourceExhausted, InvalidArgument, DeadlineExceeded
 
 from app.exceptions.gemini import GeminiException
+from app.helper.cache_helper import EmbeddingCache, CachedEmbeddings
+from app.helper.embedding_client import AsyncEmbeddingClient, BatchedEmbeddings
+from app.helper.local_embeddings import LocalOnnxEmbeddings
+from app.helper.metrics_helper import Metrics
 
 
 load_dotenv(verbose=True)
 google_api_key = os.getenv("GOOGLE_API_KEY")
 
+# Override _chat_with_retry to bypass retries (patched once at import, not per client)
+chat_models._chat_with_retry = lambda generation_method, **kwargs: generation_method(**kwargs)
+
 class GeminiLLM:
+    _model_name = "gemini-2.0-flash"
+    _temperature = 0.8
+    _top_p = 0.85
+    _clients = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def settings():
+        return (GeminiLLM._model_name, GeminiLLM._temperature, GeminiLLM._top_p)
+
     @staticmethod
     def get_chat_llm_client():
+        """
+        Returns a shared client per model settings, so its underlying
+        connection is reused across questions instead of reopened each time
+        """
         try:
-            llm = ChatGoogleGenerativeAI(
-                model = "gemini-2.0-flash", 
-                google_api_key = google_api_key, 
-                temperature = 0.8, 
-                top_p = 0.85, 
-                max_retries = 0
-            )
-            # Override _chat_with_retry to bypass retries
-            chat_models._chat_with_retry = lambda generation_method, **kwargs: generation_method(**kwargs)
+            key = GeminiLLM.settings()
+            with GeminiLLM._lock:
+                llm = GeminiLLM._clients.get(key)
+                if llm is None:
+                    llm = ChatGoogleGenerativeAI(
+                        model = GeminiLLM._model_name,
+                        google_api_key = google_api_key,
+                        temperature = GeminiLLM._temperature,
+                        top_p = GeminiLLM._top_p,
+                        max_retries = 0
+                    )
+                    GeminiLLM._clients[key] = llm
             return llm
         except Exception as e:
             # Get the traceback as a string
@@ -36,25 +63,114 @@ class GeminiLLM:
             print(f"Exception occurred on line {line_no}")
             return str(e)
     
+class LLMMetricsCallback(BaseCallbackHandler):
+    """
+    Records generation latency, time to first streamed token and token usage
+    of every chat model call it is attached to
+    """
+
+    def __init__(self):
+        self._started = {}
+        self._streaming = set()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        started = self._started.get(run_id)
+        if started is not None and run_id not in self._streaming:
+            self._streaming.add(run_id)
+            Metrics.observe("stage_seconds", time.perf_counter() - started, stage="first_token")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        self._streaming.discard(run_id)
+        if started is not None:
+            Metrics.observe("stage_seconds", time.perf_counter() - started, stage="generate")
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    Metrics.increment("tokens_total", usage.get("input_tokens", 0), kind="prompt")
+                    Metrics.increment("tokens_total", usage.get("output_tokens", 0), kind="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+        self._streaming.discard(run_id)
+        Metrics.increment("errors_total", stage="generate")
+
+
 class EmbeddingGenerator:
+    """
+    Embedding backends are registered by name and selected with EMBEDDING_BACKEND:
+    - gemini: text-embedding-004 over the network, batched by AsyncEmbeddingClient
+    - onnx: LocalOnnxEmbeddings, a CPU model from EMBEDDING_ONNX_MODEL for offline use
+    The Gemini tags below apply unless a backend sets its own model_name / dim;
+    the shared model carries the active ones, which key the embedding cache and
+    are saved with every index.
+    """
+    backend_name = os.getenv("EMBEDDING_BACKEND", "gemini")
+    backends = {}
     _model_name = "models/text-embedding-004"
     _output_dim = 768
+    _cache = None
+    _cached_model = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def register_backend(cls, name, factory):
+        cls.backends[name] = factory
 
     @staticmethod
-    def _get_embedding_model():
+    def _gemini_backend():
         return GoogleGenerativeAIEmbeddings(
             model=EmbeddingGenerator._model_name,
             google_api_key=google_api_key
         )
 
+    @staticmethod
+    def _get_embedding_model():
+        factory = EmbeddingGenerator.backends.get(EmbeddingGenerator.backend_name)
+        if factory is None:
+            raise ValueError(f"Unknown embedding backend: {EmbeddingGenerator.backend_name}")
+        return factory()
+
+    @staticmethod
+    def get_embedding_cache():
+        if EmbeddingGenerator._cache is None:
+            EmbeddingGenerator._cache = EmbeddingCache()
+        return EmbeddingGenerator._cache
+
+    @staticmethod
+    def get_cached_embedding_model():
+        """
+        Shared embedding model that serves unchanged chunks from the on-disk cache
+        and sends cache misses to the backend: remote ones in concurrent,
+        rate-limit-aware batches, local ones directly
+        """
+        with EmbeddingGenerator._lock:
+            if EmbeddingGenerator._cached_model is None:
+                backend = EmbeddingGenerator._get_embedding_model()
+                # The active backend's tags live on the CachedEmbeddings, the Gemini defaults stay as they are
+                model_name = getattr(backend, "model_name", EmbeddingGenerator._model_name)
+                output_dim = getattr(backend, "dim", EmbeddingGenerator._output_dim)
+                if not getattr(backend, "local", False):
+                    backend = BatchedEmbeddings(AsyncEmbeddingClient(backend))
+                EmbeddingGenerator._cached_model = CachedEmbeddings(
+                    backend=backend,
+                    cache=EmbeddingGenerator.get_embedding_cache(),
+                    model_name=model_name,
+                    output_dim=output_dim
+                )
+            return EmbeddingGenerator._cached_model
+
     @staticmethod
     def generate_document_embedding(text: str):
         try:
-            document_embedding = EmbeddingGenerator._get_embedding_model().embed_documents(
-                texts=[text],
-                task_type="RETRIEVAL_DOCUMENT",
-                output_dimensionality=EmbeddingGenerator._output_dim
-            )
+            document_embedding = EmbeddingGenerator.get_cached_embedding_model().embed_documents([text])
             return document_embedding
         except (ResourceExhausted, ChatGoogleGenerativeAIError, InvalidArgument, DeadlineExceeded) as e:
             return GeminiException.handle_gemini_exception(e)
@@ -70,11 +186,7 @@ class EmbeddingGenerator:
     @staticmethod
     def generate_query_embedding(text: str):
         try:
-            query_embedding = EmbeddingGenerator._get_embedding_model().embed_query(
-                text=text,
-                task_type="RETRIEVAL_QUERY",
-                output_dimensionality=EmbeddingGenerator._output_dim
-            )
+            query_embedding = EmbeddingGenerator.get_cached_embedding_model().embed_query(text)
             return query_embedding
         except (ResourceExhausted, ChatGoogleGenerativeAIError, InvalidArgument, DeadlineExceeded) as e:
             return GeminiException.handle_gemini_exception(e)
@@ -87,3 +199,6 @@ class EmbeddingGenerator:
             print(f"Exception occurred on line {line_no}")
             return str(e)
 
+
+EmbeddingGenerator.register_backend("gemini", EmbeddingGenerator._gemini_backend)
+EmbeddingGenerator.register_backend("onnx", LocalOnnxEmbeddings.from_env)
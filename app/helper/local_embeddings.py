@@ -0,0 +1,127 @@
+import os
+import hashlib
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.helper.metrics_helper import Metrics
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+except ImportError:
+    onnxruntime = None
+    Tokenizer = None
+
+
+class LocalOnnxEmbeddings(Embeddings):
+    """
+    CPU-only sentence embeddings from a local ONNX export (e.g. all-MiniLM-L6-v2,
+    bge-small or e5-small), for offline ingest and queries without a network round-trip.
+    - model_dir holds model.onnx (or an int8 model_int8.onnx / model_quantized.onnx,
+      preferred when present) and the tokenizer.json of the same model
+    - Texts are embedded in length-sorted batches to keep padding small; onnxruntime
+      spreads each batch over `threads` cores
+    - Token embeddings are mean-pooled over the attention mask and L2-normalized
+    model_name (including any prefixes) and dim tag cache keys and saved indexes,
+    so vectors from different backends or prefixes are never mixed.
+    """
+    local = True
+    _model_files = ("model_int8.onnx", "model_quantized.onnx", "model.onnx")
+
+    def __init__(self, model_dir, batch_size=None, threads=None, max_length=None,
+                 query_prefix=None, document_prefix=None):
+        if onnxruntime is None:
+            raise ImportError("The local embedding backend needs `pip install onnxruntime tokenizers`.")
+        self.model_dir = model_dir
+        # Empty settings, as in .env.sample, count as unset
+        self.batch_size = int(batch_size or os.getenv("EMBEDDING_ONNX_BATCH_SIZE") or 32)
+        self.threads = int(threads or os.getenv("EMBEDDING_ONNX_THREADS") or os.cpu_count() or 1)
+        self.max_length = int(max_length or os.getenv("EMBEDDING_ONNX_MAX_LENGTH") or 512)
+        # Some models (e5, bge) expect an instruction prefix on queries and/or passages
+        self.query_prefix = query_prefix if query_prefix is not None else os.getenv("EMBEDDING_QUERY_PREFIX", "")
+        self.document_prefix = (
+            document_prefix if document_prefix is not None else os.getenv("EMBEDDING_DOCUMENT_PREFIX", "")
+        )
+
+        model_file = next(
+            (os.path.join(model_dir, name) for name in self._model_files if os.path.isfile(os.path.join(model_dir, name))),
+            None
+        )
+        if model_file is None:
+            raise FileNotFoundError(f"No ONNX model found in {model_dir}")
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_length)
+        self.tokenizer.enable_padding()
+        # Tokenizers are not safe to reconfigure concurrently, and padding is per call
+        self._lock = threading.Lock()
+
+        self.model_name = f"onnx:{os.path.basename(os.path.normpath(model_dir))}:{os.path.basename(model_file)}"
+        if self.query_prefix or self.document_prefix:
+            # Prefixes change the vectors, so they are part of the tag
+            prefixes = hashlib.sha256(f"{self.query_prefix}\0{self.document_prefix}".encode("utf-8")).hexdigest()
+            self.model_name += f":prefix-{prefixes[:12]}"
+        self.dim = len(self._embed_batch(["dimension probe"])[0])
+
+    @staticmethod
+    def from_env():
+        model_dir = os.getenv("EMBEDDING_ONNX_MODEL")
+        if not model_dir:
+            raise ValueError("EMBEDDING_ONNX_MODEL must point to a directory with model.onnx and tokenizer.json.")
+        return LocalOnnxEmbeddings(model_dir)
+
+    @staticmethod
+    def quantize(model_dir):
+        """
+        Write model_int8.onnx next to model.onnx with dynamic int8 weight quantization,
+        which is picked up from then on. Returns its path.
+        """
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        target = os.path.join(model_dir, "model_int8.onnx")
+        quantize_dynamic(os.path.join(model_dir, "model.onnx"), target, weight_type=QuantType.QInt8)
+        return target
+
+    # ---------------- Inference ----------------
+    def _embed_batch(self, texts):
+        with self._lock:
+            encodings = self.tokenizer.encode_batch(texts)
+        mask = np.asarray([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.asarray([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.asarray([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+        outputs = self.session.run(None, {name: value for name, value in feeds.items() if name in self.input_names})
+        hidden = outputs[0]
+        if hidden.ndim == 3:
+            weights = mask[:, :, None].astype(np.float32)
+            hidden = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        norms = np.linalg.norm(hidden, axis=1, keepdims=True)
+        return (hidden / np.maximum(norms, 1e-12)).astype(np.float32)
+
+    def _embed(self, texts):
+        vectors = [None] * len(texts)
+        # Similar lengths in a batch keep padding, and wasted compute, small
+        order = sorted(range(len(texts)), key=lambda index: len(texts[index]))
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            with Metrics.timer("embedding_request", backend="onnx"):
+                batch_vectors = self._embed_batch([texts[index] for index in batch])
+            for index, vector in zip(batch, batch_vectors):
+                vectors[index] = vector.tolist()
+        Metrics.increment("chunks_total", len(texts), stage="embed")
+        return vectors
+
+    # task_type / output_dimensionality are Gemini options, accepted and ignored here
+    def embed_documents(self, texts, task_type=None, output_dimensionality=None, **kwargs):
+        return self._embed([self.document_prefix + text for text in texts])
+
+    def embed_query(self, text, task_type=None, output_dimensionality=None, **kwargs):
+        return self._embed([self.query_prefix + text])[0]
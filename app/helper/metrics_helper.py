@@ -0,0 +1,214 @@
+import time
+import threading
+import traceback
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+
+class Metrics:
+    """
+    In-process metrics for the hot paths:
+    - counters (bytes, chunks, tokens, errors, ...)
+    - latency histograms per stage (extract, chunk, embed, retrieve, generate, ...)
+    - collectors: callables polled at export time for cache hit rates and sizes
+    Exported in the Prometheus text format. When opentelemetry is installed,
+    every timed stage is also recorded as a span.
+    Updates are a dict lookup and an addition under one lock, cheap enough to stay on.
+    Each process keeps its own values; with several API workers each one reports
+    its own share.
+    """
+    prefix = "docsquery"
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    _counters = {}
+    _histograms = {}
+    _collectors = []
+    _help = {}
+    _lock = threading.Lock()
+    _tracer = otel_trace.get_tracer("docsquery") if otel_trace else None
+
+    # ---------------- Recording ----------------
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    @staticmethod
+    def increment(name, value=1, **labels):
+        key = Metrics._key(name, labels)
+        with Metrics._lock:
+            Metrics._counters[key] = Metrics._counters.get(key, 0) + value
+
+    @staticmethod
+    def observe(name, value, **labels):
+        key = Metrics._key(name, labels)
+        with Metrics._lock:
+            histogram = Metrics._histograms.get(key)
+            if histogram is None:
+                histogram = Metrics._histograms[key] = {
+                    "buckets": [0] * len(Metrics.buckets), "sum": 0.0, "count": 0
+                }
+            index = bisect_left(Metrics.buckets, value)
+            if index < len(Metrics.buckets):
+                histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    @staticmethod
+    @contextmanager
+    def timer(stage, **labels):
+        """
+        Times the block as stage_seconds{stage=...} and, with OpenTelemetry, as a span.
+        Exceptions are counted in errors_total{stage=...} and re-raised.
+        """
+        with ExitStack() as stack:
+            if Metrics._tracer is not None:
+                stack.enter_context(Metrics._tracer.start_as_current_span(f"docsquery.{stage}", attributes=labels))
+            started = time.perf_counter()
+            try:
+                yield
+            except Exception:
+                Metrics.increment("errors_total", stage=stage)
+                raise
+            finally:
+                Metrics.observe("stage_seconds", time.perf_counter() - started, stage=stage, **labels)
+
+    @staticmethod
+    def register_collector(collector):
+        """
+        collector: callable returning an iterable of (name, labels dict, value),
+        exported as gauges
+        """
+        with Metrics._lock:
+            Metrics._collectors.append(collector)
+
+    @staticmethod
+    def describe(name, help_text):
+        Metrics._help[name] = help_text
+
+    # ---------------- Snapshot / Export ----------------
+    @staticmethod
+    def _copy():
+        return {
+            "counters": dict(Metrics._counters),
+            "histograms": {
+                key: {"buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]}
+                for key, value in Metrics._histograms.items()
+            },
+        }
+
+    @staticmethod
+    def snapshot():
+        """
+        Returns a plain copy of counters and histograms
+        """
+        with Metrics._lock:
+            return Metrics._copy()
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        escaped = []
+        for key, value in pairs:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            escaped.append(f'{key}="{value}"')
+        return "{" + ",".join(escaped) + "}"
+
+    @staticmethod
+    def render_prometheus():
+        snapshot = Metrics.snapshot()
+        lines = []
+
+        def header(name, metric_type):
+            full_name = f"{Metrics.prefix}_{name}"
+            if name in Metrics._help:
+                lines.append(f"# HELP {full_name} {Metrics._help[name]}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            return full_name
+
+        for name in sorted({name for name, _ in snapshot["counters"]}):
+            full_name = header(name, "counter")
+            for (metric, labels), value in sorted(snapshot["counters"].items()):
+                if metric == name:
+                    lines.append(f"{full_name}{Metrics._labels(labels)} {value}")
+
+        for name in sorted({name for name, _ in snapshot["histograms"]}):
+            full_name = header(name, "histogram")
+            for (metric, labels), histogram in sorted(snapshot["histograms"].items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(Metrics.buckets, histogram["buckets"]):
+                    cumulative += count
+                    lines.append(f"{full_name}_bucket{Metrics._labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{full_name}_bucket{Metrics._labels(labels, [('le', '+Inf')])} {histogram['count']}")
+                lines.append(f"{full_name}_sum{Metrics._labels(labels)} {histogram['sum']}")
+                lines.append(f"{full_name}_count{Metrics._labels(labels)} {histogram['count']}")
+
+        gauges = {}
+        for collector in list(Metrics._collectors):
+            try:
+                for name, labels, value in collector():
+                    gauges.setdefault(name, []).append((Metrics._key(name, labels)[1], value))
+            except Exception:
+                print(traceback.format_exc())
+        for name in sorted(gauges):
+            full_name = header(name, "gauge")
+            for labels, value in gauges[name]:
+                lines.append(f"{full_name}{Metrics._labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def merge(snapshot):
+        """
+        Add a snapshot taken in another process (e.g. an ingest worker) to this one
+        """
+        with Metrics._lock:
+            for key, value in snapshot["counters"].items():
+                Metrics._counters[key] = Metrics._counters.get(key, 0) + value
+            for key, value in snapshot["histograms"].items():
+                histogram = Metrics._histograms.setdefault(
+                    key, {"buckets": [0] * len(Metrics.buckets), "sum": 0.0, "count": 0}
+                )
+                histogram["buckets"] = [a + b for a, b in zip(histogram["buckets"], value["buckets"])]
+                histogram["sum"] += value["sum"]
+                histogram["count"] += value["count"]
+
+    @staticmethod
+    def drain():
+        """
+        Snapshot and clear, for a worker process handing what one task recorded to the parent
+        """
+        with Metrics._lock:
+            snapshot = Metrics._copy()
+            Metrics._counters.clear()
+            Metrics._histograms.clear()
+        return snapshot
+
+    @staticmethod
+    def reset():
+        with Metrics._lock:
+            Metrics._counters.clear()
+            Metrics._histograms.clear()
+
+
+Metrics.describe("stage_seconds", "Latency of each pipeline stage in seconds.")
+Metrics.describe("errors_total", "Exceptions raised inside a timed stage.")
+Metrics.describe("bytes_total", "Bytes processed per stage.")
+Metrics.describe("chunks_total", "Chunks produced or retrieved per stage.")
+Metrics.describe("tokens_total", "Tokens processed, by kind.")
+Metrics.describe("retrievals_total", "Retrievals by path (keyword fast path or hybrid).")
+Metrics.describe("cache_hits", "Cache hits since start, by cache.")
+Metrics.describe("cache_misses", "Cache misses since start, by cache.")
+Metrics.describe("cache_hit_ratio", "Cache hit ratio since start, by cache.")
+Metrics.describe("extraction_cache_total", "Extraction cache lookups, by result.")
+Metrics.describe("embedding_throttled_total", "Embedding requests throttled by the API and retried.")
+Metrics.describe("loaded_collections", "Collections loaded in memory.")
+Metrics.describe("sessions", "Sessions attached to a collection.")
@@ -0,0 +1,152 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import traceback
+from collections import OrderedDict
+
+from langchain.prompts import PromptTemplate
+
+from app.helper.llm_helper import GeminiLLM
+from app.helper.keyword_index import KeywordIndex
+from app.helper.metrics_helper import Metrics
+from app.helper.token_helper import TokenCounter
+
+
+class QueryRewriter:
+    """
+    Condenses a follow-up question and the recent turns of its chat into a
+    standalone question, so retrieval sees what the user is actually asking about.
+    1. Questions that already stand on their own skip the LLM call (word-level heuristic)
+    2. Rewrites are cached per conversation turn (recent history + question), so a retried
+       or re-asked turn costs no extra call. The rewritten question's embedding is then
+       served by the embedding cache like any other repeated query.
+    """
+    # Words that usually point back into the conversation
+    _referring_words = {
+        "it", "its", "that", "this", "these", "those", "they", "them", "their",
+        "he", "she", "him", "her", "his", "there", "above", "previous", "earlier",
+        "former", "latter", "same", "else", "one", "ones",
+    }
+    _follow_up_openers = (
+        "what about", "how about", "and ", "also ", "but ", "so ", "then ", "why ", "more ", "what else",
+    )
+    _min_standalone_words = 4
+
+    prompt = PromptTemplate.from_template("""
+            Rewrite the follow-up question as a single standalone question that can be
+            understood without the conversation. Keep names, numbers and identifiers exactly
+            as written. Reply with the question only.
+
+            Conversation:
+            {history}
+
+            Follow-up question: {question}
+
+            Standalone question:
+            """)
+
+    def __init__(self, history_turns=None, max_entries=None, enabled=None, history_tokens=200):
+        self.history_turns = int(history_turns or os.getenv("REWRITE_HISTORY_TURNS", 3))
+        self.max_entries = int(max_entries or os.getenv("REWRITE_CACHE_MAX_ENTRIES", 1024))
+        self.enabled = os.getenv("QUERY_REWRITE", "true").lower() == "true" if enabled is None else enabled
+        # Earlier messages are truncated to this many tokens in the rewrite prompt
+        self.history_tokens = history_tokens
+        self.skipped = 0
+        self.hits = 0
+        self.calls = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ---------------- Heuristic ----------------
+    def _recent(self, history):
+        return list(history or [])[-self.history_turns * 2:]
+
+    @staticmethod
+    def is_standalone(query, history):
+        """
+        True when the question needs no conversation context: there is no history,
+        or it does not refer back and is either long enough or a bare keyword lookup
+        ("AB-1234", but not "section 4?")
+        """
+        if not history:
+            return True
+        text = query.strip().lower()
+        if text.startswith(QueryRewriter._follow_up_openers):
+            return False
+        words = re.findall(r"[a-z0-9']+", text)
+        if any(word in QueryRewriter._referring_words for word in words):
+            return False
+        if len(words) < QueryRewriter._min_standalone_words:
+            return KeywordIndex.is_lexical(query) and not text.endswith("?")
+        return True
+
+    # ---------------- Rewrite ----------------
+    @staticmethod
+    def _key(query, history):
+        payload = json.dumps([[message["role"], message["content"]] for message in history] + [query])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _format_history(self, history):
+        return "\n".join(
+            f"{message['role'].title()}: {TokenCounter.truncate(message['content'], self.history_tokens)}"
+            for message in history
+        )
+
+    def rewrite(self, query, history=None):
+        """
+        history: earlier messages of the chat as {"role", "content"} dicts, oldest first
+        Returns the standalone question, or the query itself when no rewrite is needed
+        or the rewrite fails
+        """
+        history = self._recent(history)
+        if not self.enabled or self.is_standalone(query, history):
+            with self._lock:
+                self.skipped += 1
+            Metrics.increment("rewrites_total", result="skipped")
+            return query
+
+        key = self._key(query, history)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+        if cached is not None:
+            Metrics.increment("rewrites_total", result="cached")
+            return cached
+
+        try:
+            llm = GeminiLLM.get_chat_llm_client()
+            if isinstance(llm, str):
+                raise RuntimeError(llm)
+            with Metrics.timer("rewrite"):
+                response = llm.invoke(self.prompt.format(history=self._format_history(history), question=query))
+            rewritten = str(response.content).strip() or query
+        except Exception as e:
+            traceback_str = traceback.format_exc()
+            print(traceback_str)
+            line_no = traceback.extract_tb(e.__traceback__)[-1][1]
+            print(f"Exception occurred on line {line_no}")
+            Metrics.increment("rewrites_total", result="failed")
+            return query
+
+        with self._lock:
+            self.calls += 1
+            self._cache[key] = rewritten
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        Metrics.increment("rewrites_total", result="rewritten")
+        return rewritten
+
+    # ---------------- Stats ----------------
+    def stats(self):
+        with self._lock:
+            return {
+                "skipped": self.skipped,
+                "cache_hits": self.hits,
+                "llm_calls": self.calls,
+                "entries": len(self._cache),
+            }
@@ -0,0 +1,168 @@
+import os
+import threading
+import traceback
+from collections import Counter
+
+import numpy as np
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+from app.helper.keyword_index import KeywordIndex
+from app.helper.metrics_helper import Metrics
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+except ImportError:
+    onnxruntime = None
+    Tokenizer = None
+
+
+class OnnxCrossEncoder:
+    """
+    Small cross-encoder (e.g. an int8 MiniLM ms-marco export) run on CPU with onnxruntime.
+    model_dir holds model.onnx and the tokenizer.json of the same model.
+    """
+
+    def __init__(self, model_dir, max_length=512):
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = int(os.getenv("RERANK_ONNX_THREADS", 2))
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+    def score(self, query, texts):
+        encodings = self.tokenizer.encode_batch([(query, text) for text in texts])
+        feeds = {
+            "input_ids": np.asarray([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": np.asarray([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            "token_type_ids": np.asarray([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+        logits = self.session.run(None, {name: value for name, value in feeds.items() if name in self.input_names})[0]
+        # Single-logit relevance models, or the "relevant" class of two-class ones
+        return logits[:, -1]
+
+
+class Reranker:
+    """
+    Rescoring stage between retrieval and context packing: the retriever over-fetches
+    fetch_k candidates and only the top_k after rescoring reach the prompt.
+    Strategies:
+    - lexical: query term and bigram coverage of each chunk, retrieval rank breaks ties
+    - mmr: maximal marginal relevance over the chunk embeddings (served by the embedding cache)
+    - onnx: local cross-encoder from RERANK_ONNX_MODEL, lexical when onnxruntime or the model is missing
+    - none: turns the stage off, the retriever returns top_k directly
+    Strategies are functions (query, documents, k, embeddings) -> documents,
+    added with Reranker.register.
+    """
+    strategies = {}
+    _onnx_model = None
+    _onnx_lock = threading.Lock()
+
+    def __init__(self, name=None, top_k=None, fetch_k=None):
+        self.name = name or os.getenv("RERANKER", "lexical")
+        self.top_k = int(top_k or os.getenv("RERANK_TOP_K", os.getenv("RETRIEVER_K", 4)))
+        self.fetch_k = int(fetch_k or os.getenv("RERANK_FETCH_K", 20))
+        if self.name != "none" and self.name not in self.strategies:
+            raise ValueError(f"Unknown reranker: {self.name}")
+
+    @property
+    def enabled(self):
+        return self.name != "none"
+
+    @property
+    def candidates(self):
+        """
+        Number of documents the retriever should return to this stage
+        """
+        return self.fetch_k if self.enabled else self.top_k
+
+    # ---------------- Registry ----------------
+    @classmethod
+    def register(cls, name, strategy):
+        cls.strategies[name] = strategy
+
+    def rerank(self, query, documents, embeddings=None):
+        """
+        Returns the top_k of the retrieved documents, best first
+        """
+        if not self.enabled or len(documents) <= 1:
+            return documents[:self.top_k]
+        with Metrics.timer("rerank", reranker=self.name):
+            return self.strategies[self.name](query, documents, self.top_k, embeddings)
+
+    # ---------------- Lexical ----------------
+    @staticmethod
+    def _bigrams(terms):
+        return set(zip(terms, terms[1:]))
+
+    @staticmethod
+    def rerank_lexical(query, documents, k, embeddings=None):
+        query_terms = KeywordIndex._query_terms(query)
+        if not query_terms:
+            return documents[:k]
+        unique_terms = set(query_terms)
+        query_bigrams = Reranker._bigrams(query_terms)
+
+        scored = []
+        for rank, doc in enumerate(documents):
+            doc_terms = [term for term in KeywordIndex.tokenize(doc.page_content) if term not in KeywordIndex._stopwords]
+            counts = Counter(doc_terms)
+            coverage = sum(1 for term in unique_terms if counts[term]) / len(unique_terms)
+            phrase = (
+                len(query_bigrams & Reranker._bigrams(doc_terms)) / len(query_bigrams) if query_bigrams else 0.0
+            )
+            # Rank prior keeps the retrieval order among equally covering chunks
+            scored.append((coverage + 0.5 * phrase + 1.0 / (60 + rank), rank))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [documents[rank] for _, rank in scored[:k]]
+
+    # ---------------- MMR ----------------
+    @staticmethod
+    def rerank_mmr(query, documents, k, embeddings=None):
+        # Keyword lookups keep skipping the query embedding
+        if embeddings is None or KeywordIndex.is_lexical(query):
+            return Reranker.rerank_lexical(query, documents, k)
+        query_vector = np.asarray(embeddings.embed_query(query), dtype=np.float32)
+        doc_vectors = np.asarray(embeddings.embed_documents([doc.page_content for doc in documents]), dtype=np.float32)
+        lambda_mult = float(os.getenv("RERANK_MMR_LAMBDA", 0.7))
+        selected = maximal_marginal_relevance(query_vector, doc_vectors, lambda_mult=lambda_mult, k=k)
+        return [documents[index] for index in selected]
+
+    # ---------------- ONNX Cross-Encoder ----------------
+    @staticmethod
+    def _get_onnx_model():
+        """
+        Returns the shared cross-encoder, or False when it cannot be loaded
+        """
+        with Reranker._onnx_lock:
+            if Reranker._onnx_model is None:
+                model_dir = os.getenv("RERANK_ONNX_MODEL")
+                if onnxruntime is None or not model_dir:
+                    print("ONNX reranker unavailable (needs onnxruntime, tokenizers and RERANK_ONNX_MODEL), "
+                          "using lexical reranking.")
+                    Reranker._onnx_model = False
+                else:
+                    try:
+                        Reranker._onnx_model = OnnxCrossEncoder(model_dir)
+                    except Exception:
+                        print(traceback.format_exc())
+                        Reranker._onnx_model = False
+            return Reranker._onnx_model
+
+    @staticmethod
+    def rerank_onnx(query, documents, k, embeddings=None):
+        model = Reranker._get_onnx_model()
+        if not model:
+            return Reranker.rerank_lexical(query, documents, k)
+        scores = model.score(query, [doc.page_content for doc in documents])
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [documents[index] for index in order]
+
+
+Reranker.register("lexical", Reranker.rerank_lexical)
+Reranker.register("mmr", Reranker.rerank_mmr)
+Reranker.register("onnx", Reranker.rerank_onnx)
@@ -0,0 +1,125 @@
+import os
+import time
+import threading
+from collections import Counter
+
+
+class SessionRegistry:
+    """
+    Session-scoped view over the IndexStore:
+    1. Each session is attached to exactly one collection
+    2. Collections are reference counted and stay pinned in RAM while any session uses them
+    3. Sessions idle for longer than idle_timeout are evicted and release their reference
+    """
+
+    def __init__(self, index_store, idle_timeout=None):
+        self.index_store = index_store
+        self.idle_timeout = float(idle_timeout or os.getenv("SESSION_IDLE_TIMEOUT", 1800))
+        self._sessions = {}
+        self._refcounts = Counter()
+        self._lock = threading.Lock()
+
+    # ---------------- Attach / Release ----------------
+    def attach(self, session_id, collection_name):
+        """
+        Point a session at a collection, releasing whatever it used before
+        """
+        self.evict_idle()
+        with self._lock:
+            current = self._sessions.get(session_id)
+            if current and current["collection"] == collection_name:
+                current["last_seen"] = time.time()
+                return
+            if current:
+                self._release_locked(session_id)
+
+            self._sessions[session_id] = {
+                "collection": collection_name,
+                "created_at": time.time(),
+                "last_seen": time.time(),
+            }
+            self._refcounts[collection_name] += 1
+            self.index_store.pin(collection_name)
+
+    def release(self, session_id):
+        with self._lock:
+            self._release_locked(session_id)
+
+    def _release_locked(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return
+        collection_name = session["collection"]
+        self._refcounts[collection_name] -= 1
+        if self._refcounts[collection_name] <= 0:
+            del self._refcounts[collection_name]
+        self.index_store.unpin(collection_name)
+
+    # ---------------- Lookup ----------------
+    def collection_for(self, session_id):
+        """
+        Returns the collection name of a session and marks the session as active
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            session["last_seen"] = time.time()
+            return session["collection"]
+
+    def refcount(self, collection_name):
+        return self._refcounts.get(collection_name, 0)
+
+    # ---------------- Eviction ----------------
+    def evict_idle(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            idle_sessions = [
+                session_id for session_id, session in self._sessions.items()
+                if now - session["last_seen"] > self.idle_timeout
+            ]
+            for session_id in idle_sessions:
+                self._release_locked(session_id)
+        return idle_sessions
+
+    # ---------------- Memory ----------------
+    @staticmethod
+    def _session_usage(session, shared_with, usage):
+        return {
+            "collection": session["collection"],
+            "shared_with": shared_with,
+            "collection_bytes": usage["total_bytes"],
+            "attributed_bytes": usage["total_bytes"] // shared_with,
+            "idle_seconds": round(time.time() - session["last_seen"], 1),
+        }
+
+    def session_memory(self, session_id):
+        """
+        Memory use of one session's collection, or None for an unknown session
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            session = dict(session)
+            shared_with = self._refcounts.get(session["collection"], 1)
+        return self._session_usage(session, shared_with, self.index_store.memory_usage(session["collection"]))
+
+    def memory_report(self):
+        """
+        Per-session memory use. A collection shared by several sessions is
+        split evenly between them so the totals add up to resident memory.
+        """
+        with self._lock:
+            sessions = {session_id: dict(session) for session_id, session in self._sessions.items()}
+            refcounts = dict(self._refcounts)
+
+        usage_by_collection = {
+            name: self.index_store.memory_usage(name) for name in refcounts
+        }
+        return {
+            session_id: self._session_usage(
+                session, refcounts.get(session["collection"], 1), usage_by_collection[session["collection"]]
+            )
+            for session_id, session in sessions.items()
+        }
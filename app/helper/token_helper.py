@@ -0,0 +1,70 @@
+import os
+import threading
+import traceback
+
+import tiktoken
+
+
+class TokenCounter:
+    """
+    Shared tiktoken-based token counting.
+    cl100k_base is only an approximation of Gemini's tokenizer, which is close enough
+    for budgeting. If the encoding cannot be loaded (e.g. offline without a
+    TIKTOKEN_CACHE_DIR), counts fall back to an estimate of four characters per token.
+    """
+    encoding_name = os.getenv("TOKEN_ENCODING", "cl100k_base")
+    chars_per_token = 4
+
+    _encoding = None
+    _loaded = False
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_encoding():
+        if not TokenCounter._loaded:
+            with TokenCounter._lock:
+                if not TokenCounter._loaded:
+                    try:
+                        TokenCounter._encoding = tiktoken.get_encoding(TokenCounter.encoding_name)
+                    except Exception:
+                        print(traceback.format_exc())
+                        print("Token encoding unavailable, estimating tokens from characters.")
+                    TokenCounter._loaded = True
+        return TokenCounter._encoding
+
+    @staticmethod
+    def count(text):
+        encoding = TokenCounter.get_encoding()
+        if encoding is None:
+            return -(-len(text) // TokenCounter.chars_per_token)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    @staticmethod
+    def truncate(text, max_tokens):
+        """
+        Returns the longest prefix of text that fits in max_tokens
+        """
+        if max_tokens <= 0:
+            return ""
+        encoding = TokenCounter.get_encoding()
+        if encoding is None:
+            return text[:max_tokens * TokenCounter.chars_per_token]
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+    @staticmethod
+    def split(text, max_tokens):
+        """
+        Split text into consecutive pieces of at most max_tokens tokens each,
+        cutting at token boundaries of the original string
+        """
+        encoding = TokenCounter.get_encoding()
+        if encoding is None:
+            step = max_tokens * TokenCounter.chars_per_token
+            return [text[start:start + step] for start in range(0, len(text), step)]
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return [text]
+        _, offsets = encoding.decode_with_offsets(tokens)
+        cuts = [offsets[start] for start in range(0, len(tokens), max_tokens)] + [len(text)]
+        return [text[start:end] for start, end in zip(cuts, cuts[1:]) if start < end]
@@ -1,8 +1,50 @@
+import os
+import uuid
+
 import streamlit as st
 
 from app.streamlit.template.htmlTemplates import css
+from app.exceptions.index import EmbeddingMismatchError
 from app.helper.ai_helper import AIHelper
+from app.helper.index_store import IndexStore
+from app.helper.chat_store import ChatStore
 from app.helper.general_helper import typewriter_effect
+from app.api.client import DocsQueryClient
+
+# Answer through the HTTP API when it is deployed; indexes are shared through INDEX_STORE_DIR
+API_URL = os.getenv("DOCSQUERY_API_URL")
+
+# Chats listed per sidebar page and messages rendered per "Show earlier messages" step
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", 20))
+MESSAGE_PAGE_SIZE = int(os.getenv("CHAT_MESSAGE_PAGE_SIZE", 30))
+
+
+@st.cache_resource
+def get_api_client():
+    return DocsQueryClient(API_URL)
+
+
+@st.cache_resource
+def get_chat_store():
+    return ChatStore()
+
+
+def get_chat_owner():
+    """Chats belong to a browser: the owner id is kept in the URL so it survives reloads."""
+    if "owner" not in st.query_params:
+        st.query_params["owner"] = uuid.uuid4().hex
+    return st.query_params["owner"]
+
+
+def append_to_chat(messages):
+    """Save messages to the open chat, starting a new chat with the first one."""
+    store = get_chat_store()
+    if st.session_state.chat_id is None:
+        st.session_state.chat_id = store.create_chat(
+            st.session_state.chat_owner, messages[0]["content"], st.session_state.collection_name
+        )
+        st.session_state.chat_page = 0
+    store.append_messages(st.session_state.chat_id, messages)
 
 
 def process_user_query(user_question):
@@ -14,37 +56,33 @@ def process_user_query(user_question):
     with st.chat_message("user"):
         st.markdown(user_question)
 
-    with st.chat_message("assistant"):
-        response_placeholder = st.empty()
-        response_placeholder.markdown("Generating Response...")
-
-    llm_response = AIHelper.get_llm_response(user_query=user_question)
-    if llm_response is None:
-        llm_response = "I'm sorry, I couldn't generate a response. Please try again."
-
-    with response_placeholder.container():
-        typewriter_effect(llm_response, speed=20)
-
-    # Update chat history for selected chat or current chat
-    if st.session_state.selected_chat_index is not None:
-        # Update the selected chat
-        selected_chat = st.session_state.chat_histories[st.session_state.selected_chat_index]
-        selected_chat["messages"].append({"role": "user", "content": user_question})
-        selected_chat["messages"].append({"role": "assistant", "content": llm_response})
-    else:
-        # Handle new conversation
-        st.session_state.current_chat.append({"role": "user", "content": user_question})
-        st.session_state.current_chat.append({"role": "assistant", "content": llm_response})
+    # Recent turns of the open chat, so follow-up questions can be made standalone
+    history = []
+    if st.session_state.chat_id is not None:
+        history = get_chat_store().get_messages(
+            st.session_state.chat_id, limit=AIHelper.query_rewriter.history_turns * 2
+        )
 
+    # Render tokens as Gemini produces them
+    with st.chat_message("assistant"):
+        if API_URL:
+            tokens = get_api_client().stream_query(st.session_state.collection_name, user_question, history)
+        else:
+            tokens = AIHelper.stream_llm_response(
+                user_query=user_question,
+                session_id=st.session_state.session_id,
+                history=history
+            )
+        llm_response = st.write_stream(tokens)
+        if not llm_response:
+            llm_response = "I'm sorry, I couldn't generate a response. Please try again."
+            st.markdown(llm_response)
 
-def store_chat_history():
-    """Save the current chat history to the chat histories list with a custom title."""
-    if st.session_state.current_chat:
-        # Use the first message from the current chat as the title
-        title = (st.session_state.current_chat[0]["content"] if st.session_state.current_chat else "Untitled Chat")
-        # Insert at the beginning of the list for latest questions first
-        st.session_state.chat_histories.insert(0, {"title": title, "messages": st.session_state.current_chat.copy()})
-        st.session_state.current_chat = []
+    # Append the turn to the open chat (or start one)
+    append_to_chat([
+        {"role": "user", "content": user_question},
+        {"role": "assistant", "content": llm_response},
+    ])
 
 
 def chat_preview(message):
@@ -56,15 +94,81 @@ def chat_preview(message):
 
 def display_chat_history():
     st.sidebar.header("Chat History")
+    store = get_chat_store()
+    owner = st.session_state.chat_owner
+    page = st.session_state.chat_page
+
+    # Only one page of chat titles is read and rendered per rerun
+    for chat in store.list_chats(owner, offset=page * CHAT_PAGE_SIZE, limit=CHAT_PAGE_SIZE):
+        if st.sidebar.button(chat_preview(chat["title"]), key=f"chat_{chat['id']}"):
+            st.session_state.chat_id = chat["id"]
+            st.session_state.message_limit = MESSAGE_PAGE_SIZE
+
+    total = store.count_chats(owner)
+    if total > CHAT_PAGE_SIZE:
+        newer_col, older_col = st.sidebar.columns(2)
+        if newer_col.button("‹ Newer", disabled=page == 0):
+            st.session_state.chat_page -= 1
+            st.rerun()
+        if older_col.button("Older ›", disabled=(page + 1) * CHAT_PAGE_SIZE >= total):
+            st.session_state.chat_page += 1
+            st.rerun()
 
-    # Display each chat entry as a button in the sidebar
-    for idx, history in enumerate(st.session_state.chat_histories):
-        user_message = (history["messages"][0]["content"] if history["messages"] else "No messages")
-        if (user_message == "Hello! I'm DocuQuery AI Assistant. Ask me anything about your documents."):
-            continue
-        preview = chat_preview(user_message)
-        if st.sidebar.button(preview, key=f"chat_{idx}"):
-            st.session_state.selected_chat_index = idx
+
+def display_chat_messages():
+    """Render the latest messages of the open chat; earlier ones are loaded on request."""
+    store = get_chat_store()
+    chat = store.get_chat(st.session_state.chat_id)
+    if chat is None:
+        st.session_state.chat_id = None
+        return
+
+    if chat["message_count"] > st.session_state.message_limit:
+        if st.button("Show earlier messages"):
+            st.session_state.message_limit += MESSAGE_PAGE_SIZE
+            st.rerun()
+
+    for message in store.get_messages(chat["id"], limit=st.session_state.message_limit):
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+
+def apply_collection_update(result, success_message):
+    """Point the session at the updated collection, or show the error returned."""
+    if isinstance(result, str):
+        append_to_chat([{"role": "assistant", "content": result}])
+        return
+    collection_name, vectorstore = result
+    # The session may have been moved to a private fork of a shared collection
+    AIHelper.index_store.add_owner(collection_name, st.session_state.chat_owner)
+    st.session_state.collection_name = collection_name
+    st.session_state.vectorstore = vectorstore
+    st.session_state.conversation = AIHelper.get_conversation_chain(collection_name)
+    st.success(success_message)
+
+
+def manage_documents():
+    """Add files to or remove files from the current index without rebuilding it."""
+    with st.expander("Manage documents"):
+        added_files = st.file_uploader(
+            "Add more documents",
+            type=SUPPORTED_FORMATS,
+            accept_multiple_files=True,
+            key="added_files"
+        )
+        if st.button("Add") and added_files:
+            with st.spinner("Adding documents..."):
+                result = AIHelper.add_documents(st.session_state.session_id, added_files)
+            apply_collection_update(result, "Documents added.")
+
+        meta = AIHelper.index_store.get_meta(st.session_state.collection_name) or {}
+        for idx, source in enumerate(meta.get("sources", [])):
+            name_col, button_col = st.columns([4, 1])
+            name_col.write(source)
+            if button_col.button("✕", key=f"remove_source_{idx}"):
+                result = AIHelper.remove_documents(st.session_state.session_id, [source])
+                apply_collection_update(result, f"Removed {source}.")
+                st.rerun()
 
 
 SUPPORTED_FORMATS = [
@@ -79,16 +183,20 @@ def main():
     # Initialize session state variables (keep your existing behavior)
     if "conversation" not in st.session_state:
         st.session_state.conversation = None
-    if "current_chat" not in st.session_state:
-        st.session_state.current_chat = []
-    if "chat_histories" not in st.session_state:
-        st.session_state.chat_histories = []
-    if "selected_chat_index" not in st.session_state:
-        st.session_state.selected_chat_index = None
-    if "new_chat" not in st.session_state:
-        st.session_state.new_chat = False
+    if "chat_owner" not in st.session_state:
+        st.session_state.chat_owner = get_chat_owner()
+    if "chat_id" not in st.session_state:
+        st.session_state.chat_id = None
+    if "chat_page" not in st.session_state:
+        st.session_state.chat_page = 0
+    if "message_limit" not in st.session_state:
+        st.session_state.message_limit = MESSAGE_PAGE_SIZE
     if "vectorstore" not in st.session_state:
         st.session_state.vectorstore = None
+    if "collection_name" not in st.session_state:
+        st.session_state.collection_name = None
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = [
             {
@@ -97,6 +205,10 @@ def main():
             },
         ]
 
+    # Keep this session's index registered; re-attaches after an idle eviction
+    if st.session_state.collection_name:
+        AIHelper.session_registry.attach(st.session_state.session_id, st.session_state.collection_name)
+
     # Sidebar: Document upload or chat history
     with st.sidebar:
         st.subheader("Your documents")
@@ -120,58 +232,80 @@ def main():
                             f"Unsupported file format for: {', '.join(unsupported_files)}.\n"
                             f"Please upload one of: {', '.join(SUPPORTED_FORMATS)}."
                         )
-                        st.session_state.current_chat.append({"role": "assistant", "content": msg})
+                        append_to_chat([{"role": "assistant", "content": msg}])
                     else:
                         with st.spinner("Processing documents..."):
-                            vectorstore = AIHelper.build_vectorstore_from_docs(uploaded_files)
+                            collection_name = IndexStore.collection_name_for(uploaded_files)
+                            vectorstore = AIHelper.build_vectorstore_from_docs(uploaded_files, collection_name)
                             if isinstance(vectorstore, str):
-                                st.session_state.current_chat.append({"role": "assistant", "content": vectorstore})
+                                append_to_chat([{"role": "assistant", "content": vectorstore}])
                             else:
+                                AIHelper.index_store.add_owner(collection_name, st.session_state.chat_owner)
                                 st.session_state.vectorstore = vectorstore
-                                st.session_state.conversation = AIHelper.initialize_conversation_chain(vectorstore)
+                                st.session_state.collection_name = collection_name
+                                AIHelper.session_registry.attach(st.session_state.session_id, collection_name)
+                                st.session_state.conversation = AIHelper.get_conversation_chain(collection_name)
                                 st.success("Documents processed successfully.")
+
+            # Reopen a document set this browser indexed before, without re-uploading it
+            saved_collections = AIHelper.index_store.list_collections(owner=st.session_state.chat_owner)
+            if saved_collections:
+                labels = {
+                    name: ", ".join(meta.get("sources", [])) or name
+                    for name, meta in saved_collections
+                }
+                selected_collection = st.selectbox(
+                    "Or open previously processed documents",
+                    options=list(labels),
+                    format_func=lambda name: labels[name],
+                    index=None
+                )
+                if selected_collection and st.button("Open"):
+                    try:
+                        vectorstore = AIHelper.get_vectorstore(selected_collection)
+                    except EmbeddingMismatchError as e:
+                        st.warning(str(e))
+                        vectorstore = None
+                    if vectorstore is not None:
+                        st.session_state.vectorstore = vectorstore
+                        st.session_state.collection_name = selected_collection
+                        AIHelper.session_registry.attach(st.session_state.session_id, selected_collection)
+                        st.session_state.conversation = AIHelper.get_conversation_chain(selected_collection)
+                        st.rerun()
         else:
             if st.session_state.conversation is None:
-                st.session_state.conversation = AIHelper.initialize_conversation_chain(st.session_state.vectorstore)
+                st.session_state.conversation = AIHelper.get_conversation_chain(st.session_state.collection_name)
 
+            manage_documents()
+
+            # The open chat is already saved, so a new chat only closes it
             if st.sidebar.button("+ New Chat"):
-                if st.session_state.current_chat:
-                    store_chat_history()
-                st.session_state.new_chat = True
-                st.session_state.selected_chat_index = None
-                st.session_state.current_chat = []
+                st.session_state.chat_id = None
+                st.session_state.message_limit = MESSAGE_PAGE_SIZE
 
             display_chat_history()
 
+            session_memory = AIHelper.session_registry.session_memory(st.session_state.session_id)
+            if session_memory:
+                st.caption(f"Index memory: {session_memory['attributed_bytes'] / (1024 * 1024):.1f} MB")
+
     # Main layout header (unchanged)
     _, col2 = st.columns([1, 2.8])
     with col2:
         st.header("DocsQuery AI ! :books:")
 
-    # If no selected chat and nothing in current chat, show initial assistant greeting(s)
-    if st.session_state.selected_chat_index is None and not st.session_state.current_chat:
+    # If no chat is open, show initial assistant greeting(s)
+    if st.session_state.chat_id is None:
         for message in st.session_state.chat_history:
             with st.chat_message(message["role"]):
                 if message["content"] == "Hello! I'm DocuQuery AI Assistant. Ask me anything about your documents.":
                     typewriter_effect(message["content"], speed=20)
                 else:
                     st.markdown(message["content"])
-
-    # Display selected chat messages or current chat messages
-    if st.session_state.selected_chat_index is not None:
-        selected_chat = st.session_state.chat_histories[st.session_state.selected_chat_index]
-        for message in selected_chat["messages"]:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
     else:
-        for message in st.session_state.current_chat:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
+        display_chat_messages()
 
     # Handle user-typed input only
     user_question = st.chat_input(placeholder="Ask question about your documents")
     if user_question:
         process_user_query(user_question)
-
-    if st.session_state.new_chat:
-        st.session_state.new_chat = False
@@ -0,0 +1,52 @@
+"""
+Recall vs latency of the flat, HNSW and IVF-PQ index modes against the exact
+flat baseline on the same vectors.
+
+Usage:
+    python -m benchmarks.ann_recall --collection <name>
+    python -m benchmarks.ann_recall --synthetic 100000 --dim 768
+"""
+import os
+import json
+import argparse
+
+import faiss
+import numpy as np
+
+from app.helper.index_store import IndexStore
+from app.helper.index_factory import IndexFactory
+
+
+def load_collection_vectors(collection_name):
+    store = IndexStore()
+    index = faiss.read_index(os.path.join(store.root, collection_name, "index.faiss"))
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", help="saved collection to read vectors from")
+    parser.add_argument("--synthetic", type=int, default=50_000, help="number of random vectors when no collection is given")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.collection:
+        vectors = load_collection_vectors(args.collection)
+    else:
+        vectors = rng.standard_normal((args.synthetic, args.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    # Queries are perturbed corpus vectors, close to real "find this passage" lookups
+    picks = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    queries = vectors[picks] + rng.normal(0, 0.01, (len(picks), vectors.shape[1])).astype(np.float32)
+
+    print(json.dumps(IndexFactory.recall_report(vectors, queries, k=args.k), indent=2))
+
+
+if __name__ == "__main__":
+    main()
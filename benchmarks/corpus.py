@@ -0,0 +1,222 @@
+"""
+Deterministic synthetic corpus covering every DocumentHelper format.
+
+Usage:
+    python -m benchmarks.corpus --out /tmp/corpus --paragraphs 200
+"""
+import io
+import os
+import json
+import random
+import argparse
+
+import docx
+import pptx
+import pandas as pd
+from odf.opendocument import OpenDocumentText
+from odf.text import P
+
+_WORDS = """
+agreement buyer seller delivery invoice payment warranty clause liability notice
+termination supplier pump valve pressure rating service contract schedule annex
+shipment inspection quality defect repair replacement period months years days
+customer order quantity price currency discount tax region office manager report
+""".split()
+
+
+class CorpusGenerator:
+    """
+    Generates the same documents for the same seed: paragraphs of filler sentences
+    with planted identifiers (e.g. "AB-1234", "clause 4.2.1") so keyword queries have
+    exact answers, and tables of mixed numeric and text columns.
+    """
+
+    def __init__(self, paragraphs=100, rows=2000, seed=0):
+        self.paragraphs = paragraphs
+        self.rows = rows
+        self.seed = seed
+
+    # ---------------- Content ----------------
+    def _rng(self, name):
+        return random.Random(f"{self.seed}-{name}")
+
+    def _sentence(self, rng):
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 18))]
+        if rng.random() < 0.2:
+            words.insert(rng.randrange(len(words)), f"{rng.choice('ABCDEFGH')}{rng.choice('KLMNPQRS')}-{rng.randint(1000, 9999)}")
+        if rng.random() < 0.1:
+            words.insert(rng.randrange(len(words)), f"clause {rng.randint(1, 9)}.{rng.randint(1, 9)}.{rng.randint(1, 9)}")
+        sentence = " ".join(words)
+        return sentence[0].upper() + sentence[1:] + "."
+
+    def paragraphs_for(self, name):
+        rng = self._rng(name)
+        return [" ".join(self._sentence(rng) for _ in range(rng.randint(3, 6))) for _ in range(self.paragraphs)]
+
+    def table_for(self, name):
+        rng = self._rng(name)
+        return pd.DataFrame({
+            "order_id": [f"PO-{100000 + row}" for row in range(self.rows)],
+            "customer": [rng.choice(_WORDS).title() for _ in range(self.rows)],
+            "quantity": [rng.randint(1, 500) for _ in range(self.rows)],
+            "price": [round(rng.uniform(1, 1000), 2) for _ in range(self.rows)],
+            "notes": [self._sentence(rng) for _ in range(self.rows)],
+        })
+
+    def questions(self, count=50):
+        """
+        A mix of natural-language and lexical (identifier) queries
+        """
+        rng = self._rng("questions")
+        identifiers = [
+            word.rstrip(".") for paragraph in self.paragraphs_for("pdf")
+            for word in paragraph.split() if "-" in word
+        ]
+        queries = []
+        for index in range(count):
+            if identifiers and index % 3 == 0:
+                queries.append(rng.choice(identifiers))
+            else:
+                queries.append(f"What does the {rng.choice(_WORDS)} {rng.choice(_WORDS)} say about {rng.choice(_WORDS)}?")
+        return queries
+
+    # ---------------- Writers ----------------
+    @staticmethod
+    def _pdf(pages):
+        """
+        Minimal text-only PDF writer, one page per list of lines
+        """
+        objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+        page_ids = []
+        for lines in pages:
+            escaped = [line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines]
+            stream = "BT /F1 9 Tf 40 800 Td 11 TL " + " ".join(f"({line}) '" for line in escaped) + " ET"
+            objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+            objects.append(
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+            )
+            page_ids.append(len(objects))
+        objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{page} 0 R' for page in page_ids)}] /Count {len(page_ids)} >>"
+
+        out = io.BytesIO()
+        out.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(out.tell())
+            out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+        xref = out.tell()
+        out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+        for offset in offsets:
+            out.write(f"{offset:010d} 00000 n \n".encode())
+        out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+        return out.getvalue()
+
+    def pdf(self):
+        lines = []
+        for paragraph in self.paragraphs_for("pdf"):
+            words = paragraph.split()
+            lines.extend(" ".join(words[start:start + 14]) for start in range(0, len(words), 14))
+        return self._pdf([lines[start:start + 60] for start in range(0, len(lines), 60)])
+
+    def docx(self):
+        document = docx.Document()
+        for paragraph in self.paragraphs_for("docx"):
+            document.add_paragraph(paragraph)
+        out = io.BytesIO()
+        document.save(out)
+        return out.getvalue()
+
+    def txt(self):
+        return "\n".join(self.paragraphs_for("txt")).encode("utf-8")
+
+    def pptx(self):
+        presentation = pptx.Presentation()
+        paragraphs = self.paragraphs_for("pptx")
+        for start in range(0, len(paragraphs), 4):
+            slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+            slide.shapes.title.text = f"Section {start // 4 + 1}"
+            slide.placeholders[1].text = "\n".join(paragraphs[start:start + 4])
+        out = io.BytesIO()
+        presentation.save(out)
+        return out.getvalue()
+
+    def odt(self):
+        document = OpenDocumentText()
+        for paragraph in self.paragraphs_for("odt"):
+            document.text.addElement(P(text=paragraph))
+        out = io.BytesIO()
+        document.write(out)
+        return out.getvalue()
+
+    def rtf(self):
+        body = "".join(f"{paragraph}\\par\n" for paragraph in self.paragraphs_for("rtf"))
+        return ("{\\rtf1\\ansi\\deff0 {\\fonttbl {\\f0 Helvetica;}}\n" + body + "}").encode("latin-1")
+
+    def csv(self):
+        return self.table_for("csv").to_csv(index=False).encode("utf-8")
+
+    def xlsx(self):
+        out = io.BytesIO()
+        table = self.table_for("xlsx")
+        half = len(table) // 2
+        with pd.ExcelWriter(out) as writer:
+            table.iloc[:half].to_excel(writer, sheet_name="Orders", index=False)
+            table.iloc[half:].to_excel(writer, sheet_name="Archive", index=False)
+        return out.getvalue()
+
+    # Legacy formats are produced by converting the modern ones with Spire
+    def doc(self):
+        from spire.doc import Document, FileFormat, Stream
+        document = Document()
+        document.LoadFromStream(Stream(self.docx()), FileFormat.Docx)
+        out = Stream()
+        document.SaveToStream(out, FileFormat.Doc)
+        document.Close()
+        return bytes(out.ToArray())
+
+    def ppt(self):
+        from spire.presentation import Presentation, FileFormat, Stream
+        presentation = Presentation()
+        presentation.LoadFromStream(Stream(self.pptx()), FileFormat.Pptx2013)
+        out = Stream()
+        presentation.SaveToFile(out, FileFormat.PPT)
+        presentation.Dispose()
+        return bytes(out.ToArray())
+
+    def xls(self):
+        from spire.xls import Workbook, FileFormat, Stream
+        workbook = Workbook()
+        workbook.LoadFromStream(Stream(self.xlsx()))
+        out = Stream()
+        workbook.SaveToStream(out, FileFormat.Version97to2003)
+        workbook.Dispose()
+        return bytes(out.ToArray())
+
+    formats = ("pdf", "doc", "docx", "txt", "ppt", "pptx", "odt", "rtf", "csv", "xls", "xlsx")
+
+    def generate(self, formats=None):
+        """
+        Returns {file name: bytes} with one document per format
+        """
+        return {f"corpus.{ext}": getattr(self, ext)() for ext in formats or self.formats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--paragraphs", type=int, default=100)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    files = CorpusGenerator(args.paragraphs, args.rows, args.seed).generate()
+    for name, data in files.items():
+        with open(os.path.join(args.out, name), "wb") as out_file:
+            out_file.write(data)
+    print(json.dumps({name: len(data) for name, data in files.items()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
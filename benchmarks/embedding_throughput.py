@@ -0,0 +1,53 @@
+"""
+Offline embedding throughput of AsyncEmbeddingClient against the fake backend,
+compared with embedding one batch at a time.
+
+Usage:
+    python -m benchmarks.embedding_throughput --chunks 5000 --latency 0.2 --fail-rate 0.05
+"""
+import json
+import time
+import asyncio
+import argparse
+
+from app.helper.embedding_client import AsyncEmbeddingClient, FakeEmbeddingBackend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--chunk-chars", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests raising ResourceExhausted")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    texts = [f"chunk {n} " + "x" * args.chunk_chars for n in range(args.chunks)]
+
+    serial_backend = FakeEmbeddingBackend(dim=768, latency=args.latency)
+    started = time.perf_counter()
+    for start in range(0, len(texts), 100):
+        serial_backend.embed_documents(texts[start:start + 100])
+    serial_seconds = time.perf_counter() - started
+
+    backend = FakeEmbeddingBackend(dim=768, latency=args.latency, fail_rate=args.fail_rate)
+    client = AsyncEmbeddingClient(backend, max_concurrency=args.concurrency, base_delay=args.latency)
+    started = time.perf_counter()
+    asyncio.run(client.aembed_documents(texts))
+    client_seconds = time.perf_counter() - started
+
+    print(json.dumps({
+        "chunks": args.chunks,
+        "serial": {"seconds": round(serial_seconds, 2), "chunks_per_second": round(args.chunks / serial_seconds, 1)},
+        "client": {
+            "seconds": round(client_seconds, 2),
+            "chunks_per_second": round(args.chunks / client_seconds, 1),
+            "requests": client.requests,
+            "throttled": client.throttled,
+            "final_concurrency": client.concurrency,
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
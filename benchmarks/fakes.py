@@ -0,0 +1,73 @@
+"""
+Offline stand-ins for Gemini, so ingest and query paths can be timed without
+network calls or API keys. Latencies are configurable to model the real service.
+"""
+import os
+import time
+import tempfile
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import SimpleChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+
+class FakeChatModel(SimpleChatModel):
+    """
+    Deterministic chat model: waits `latency` seconds before the first token and
+    `token_latency` per token after it, and answers with a summary of the prompt size
+    """
+    latency: float = 0.5
+    token_latency: float = 0.01
+    answer_words: int = 40
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gemini"
+
+    def _answer(self, messages: List[BaseMessage]) -> List[str]:
+        prompt_chars = sum(len(str(message.content)) for message in messages)
+        words = [f"Answer", f"from", f"{prompt_chars}", "prompt", "characters:"]
+        return words + ["lorem"] * max(0, self.answer_words - len(words))
+
+    def _call(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+              run_manager: Any = None, **kwargs: Any) -> str:
+        words = self._answer(messages)
+        time.sleep(self.latency + self.token_latency * len(words))
+        return " ".join(words)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for index, word in enumerate(self._answer(messages)):
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if index == 0 else " " + word))
+
+
+def install(workdir=None, embedding_latency=0.05, llm_latency=0.5, token_latency=0.01):
+    """
+    Point every cache and the index store at workdir and replace the Gemini clients
+    with fakes. Must run before app modules are imported, since they read their
+    settings from the environment at import time.
+    Returns workdir.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="docsquery-bench-")
+    os.environ.update({
+        "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "offline"),
+        "INDEX_STORE_DIR": os.path.join(workdir, "index_store"),
+        "DOCSQUERY_CACHE_DIR": os.path.join(workdir, "cache"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "cache", "embeddings.sqlite3"),
+        "EXTRACTION_CACHE_DIR": os.path.join(workdir, "cache", "extracted"),
+        # Every query should reach the LLM; the answer cache is measured separately
+        "ANSWER_CACHE_THRESHOLD": os.getenv("ANSWER_CACHE_THRESHOLD", "2"),
+    })
+
+    from app.helper.llm_helper import GeminiLLM, EmbeddingGenerator
+    from app.helper.embedding_client import FakeEmbeddingBackend
+
+    chat_model = FakeChatModel(latency=llm_latency, token_latency=token_latency)
+    GeminiLLM.get_chat_llm_client = staticmethod(lambda: chat_model)
+    EmbeddingGenerator._get_embedding_model = staticmethod(
+        lambda: FakeEmbeddingBackend(dim=EmbeddingGenerator._output_dim, latency=embedding_latency)
+    )
+    return workdir
@@ -0,0 +1,211 @@
+"""
+End-to-end performance suite on a synthetic corpus, with Gemini replaced by
+offline fakes of configurable latency. Covers extraction, chunking, ingest,
+index build, retrieval and full query latency, and writes a JSON report for
+regression tracking.
+
+Usage:
+    python -m benchmarks.suite --paragraphs 200 --rows 5000 --queries 50 --output report.json
+    python -m benchmarks.suite --llm-latency 0 --embedding-latency 0 --memory
+"""
+import os
+import sys
+import json
+import shutil
+import time
+import platform
+import argparse
+import resource
+import subprocess
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+
+from benchmarks import fakes
+from benchmarks.corpus import CorpusGenerator
+
+
+def _summary(seconds):
+    """
+    Latency percentiles in milliseconds
+    """
+    if not seconds:
+        return {"count": 0}
+    ms = np.asarray(seconds) * 1000
+    return {
+        "count": len(ms),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+class Recorder:
+    """
+    Times stages and, with memory tracing on, records the peak Python allocation of each
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.results = {}
+
+    @contextmanager
+    def stage(self, name, **extra):
+        if self.trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        record = dict(extra)
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - started, 4)
+            if self.trace_memory:
+                record["peak_alloc_bytes"] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            self.results[name] = record
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    workdir = fakes.install(
+        args.workdir,
+        embedding_latency=args.embedding_latency,
+        llm_latency=args.llm_latency,
+        token_latency=args.token_latency
+    )
+    # A reused workdir would serve the cold ingest from the last run's caches and indexes
+    for directory in (os.environ["DOCSQUERY_CACHE_DIR"], os.environ["INDEX_STORE_DIR"]):
+        shutil.rmtree(directory, ignore_errors=True)
+
+    # Imported after the fakes are installed, so settings pick up the benchmark workdir
+    from app.helper.ai_helper import AIHelper
+    from app.helper.chunk_helper import ChunkHelper
+    from app.helper.document_helper import DocumentHelper, UploadedBytes
+    from app.helper.hybrid_retriever import HybridRetriever
+    from app.helper.index_factory import IndexFactory
+    from app.helper.keyword_index import KeywordIndex
+    from app.helper.llm_helper import EmbeddingGenerator
+
+    recorder = Recorder(trace_memory=args.memory)
+    generator = CorpusGenerator(args.paragraphs, args.rows, args.seed)
+    files = generator.generate(args.formats.split(",") if args.formats else None)
+    queries = generator.questions(args.queries)
+
+    # ---------------- Extraction + Chunking, per format ----------------
+    segments_by_file = {}
+    for name, data in files.items():
+        ext = name.split(".")[-1]
+        with recorder.stage(f"extract.{ext}", bytes=len(data)) as record:
+            segments = list(DocumentHelper._iter_segments(UploadedBytes(name, data), ext))
+            record["segments"] = len(segments)
+            record["chars"] = sum(len(text) for text, _ in segments)
+        segments_by_file[name] = segments
+
+    for name, segments in segments_by_file.items():
+        ext = name.split(".")[-1]
+        with recorder.stage(f"chunk.{ext}") as record:
+            chunks = list(ChunkHelper.split(segments, name, ext))
+            record["chunks"] = len(chunks)
+            record["tokens"] = sum(metadata["token_count"] for _, metadata in chunks)
+
+    uploads = [UploadedBytes(name, data) for name, data in files.items()]
+
+    # ---------------- Ingest: cold, then with warm extraction/embedding caches ----------------
+    with recorder.stage("ingest.cold") as record:
+        vectorstore = AIHelper.build_vectorstore_from_docs(uploads, "bench-cold")
+        if isinstance(vectorstore, str):
+            raise RuntimeError(vectorstore)
+        record["chunks"] = vectorstore.index.ntotal
+    with recorder.stage("ingest.warm") as record:
+        record["chunks"] = AIHelper.build_vectorstore_from_docs(uploads, "bench-warm").index.ntotal
+    recorder.results["ingest.warm"]["embedding_cache"] = EmbeddingGenerator.get_embedding_cache().stats()
+
+    # ---------------- Index Build + ANN Recall ----------------
+    index = vectorstore.index
+    vectors = index.reconstruct_n(0, index.ntotal)
+    modes = ["flat", "hnsw"] + (["ivfpq"] if len(vectors) >= 10_000 else [])
+    query_vectors = np.asarray(
+        [EmbeddingGenerator.get_cached_embedding_model().embed_query(query) for query in queries], dtype=np.float32
+    )
+    with recorder.stage("index") as record:
+        record["modes"] = IndexFactory.recall_report(vectors, query_vectors, k=min(10, len(vectors)), modes=modes)
+    recorder.results["index"]["memory"] = AIHelper.index_store.memory_usage("bench-cold")
+
+    # ---------------- Retrieval ----------------
+    retriever = HybridRetriever(
+        vectorstore=vectorstore,
+        keyword_index=AIHelper.index_store.get_keyword_index("bench-cold", vectorstore.embedding_function)
+    )
+    lexical, semantic = [], []
+    with recorder.stage("retrieve") as record:
+        for query in queries:
+            started = time.perf_counter()
+            retriever.invoke(query)
+            (lexical if KeywordIndex.is_lexical(query) else semantic).append(time.perf_counter() - started)
+        record["lexical"] = _summary(lexical)
+        record["semantic"] = _summary(semantic)
+
+    # ---------------- Full Query ----------------
+    latencies, first_token = [], []
+    with recorder.stage("query") as record:
+        for query in queries:
+            started = time.perf_counter()
+            AIHelper.answer_query(query, "bench-cold")
+            latencies.append(time.perf_counter() - started)
+        for query in queries:
+            started = time.perf_counter()
+            for index_, _ in enumerate(AIHelper.stream_query(query, "bench-cold")):
+                if index_ == 0:
+                    first_token.append(time.perf_counter() - started)
+        record["answer"] = _summary(latencies)
+        record["stream_first_token"] = _summary(first_token)
+        record["context_packing"] = AIHelper.context_packer.stats()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "workdir": workdir,
+            "args": vars(args),
+            "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        },
+        "stages": recorder.results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=100, help="paragraphs per text document")
+    parser.add_argument("--rows", type=int, default=2000, help="rows per table document")
+    parser.add_argument("--formats", help="comma-separated subset of formats, default all")
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="seconds per embedding request")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds before the first answer token")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="seconds per answer token")
+    parser.add_argument("--memory", action="store_true", help="trace peak Python allocations per stage (slower)")
+    parser.add_argument("--workdir", help="directory for caches and indexes, cleared first, default a new temp dir")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = json.dumps(run(args), indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Spreadsheet/CSV extraction: row-wise iterrows formatting (previous
+implementation) against the columnar, chunked DocumentHelper path.
+
+Usage:
+    python -m benchmarks.tabular_extraction --rows 500000
+"""
+import io
+import json
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from app.helper.document_helper import DocumentHelper, UploadedBytes
+
+
+def iterrows_extract_csv(file):
+    # Previous DocumentHelper.extract_csv, kept here as the baseline
+    df = pd.read_csv(file)
+    rows = [
+        ", ".join(f"{col}: {row[col]}" for col in df.columns)
+        for _, row in df.iterrows()
+    ]
+    return "\n".join(rows)
+
+
+def columnar_extract_csv(file):
+    return list(DocumentHelper.iter_table_chunks(file, "csv"))
+
+
+def make_csv(rows):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "id": np.arange(rows),
+        "amount": rng.random(rows).round(2),
+        "region": rng.choice(["north", "south", "east", "west"], rows),
+        "sku": [f"SKU-{n:07d}" for n in rng.integers(0, 10_000_000, rows)],
+        "note": rng.choice(["ok", "late delivery", "returned", ""], rows),
+    })
+    buffer = io.BytesIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+
+def measure(extract, data):
+    tracemalloc.start()
+    started = time.perf_counter()
+    extract(UploadedBytes("bench.csv", data))
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(seconds, 3), "peak_mb": round(peak / (1024 * 1024), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    data = make_csv(args.rows)
+    baseline = measure(iterrows_extract_csv, data)
+    columnar = measure(columnar_extract_csv, data)
+    print(json.dumps({
+        "rows": args.rows,
+        "csv_mb": round(len(data) / (1024 * 1024), 1),
+        "iterrows": baseline,
+        "columnar": columnar,
+        "speedup": round(baseline["seconds"] / columnar["seconds"], 1) if columnar["seconds"] else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()